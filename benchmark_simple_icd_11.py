@@ -0,0 +1,234 @@
+# Benchmarks for simple_icd_11, run against a FakeICDAPI in the same process, so that they need no network and no credentials
+# Usage: python benchmark_simple_icd_11.py [--fixture FILE] [--latency MILLISECONDS] [--repeat N] [--decoder NAME] [--json]
+# Without --fixture, a fixture generated with generateFixture() is used; --latency delays each answer of the API (by 5 ms by default), to simulate a remote deployment
+# --decoder chooses the JSON parser used by the library for all the benchmarks (by default, the fastest one installed)
+
+from __future__ import annotations
+from typing import Callable, Any
+import argparse, gc, json, importlib, os, statistics, tempfile, time, tracemalloc
+import simple_icd_11
+from simple_icd_11 import ICDExplorer
+from fake_icd_api import FakeICDAPI, generateFixture, loadFixture, saveSimpleTabulation
+
+
+# Calls function repeat times and returns the median and the minimum of the durations, in seconds
+def measure(function: Callable[[], Any], repeat: int) -> tuple[float, float]:
+    durations: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), min(durations)
+
+
+# Returns the JSON parsers that can be used by the library, by name
+def getDecoders() -> dict[str, Callable[[bytes], Any]]:
+    decoders: dict[str, Callable[[bytes], Any]] = {"json": json.loads}
+    try:
+        decoders["orjson"] = importlib.import_module("orjson").loads
+    except ImportError:
+        pass
+    try:
+        decoders["msgspec"] = importlib.import_module("msgspec").json.decode
+    except ImportError:
+        pass
+    return decoders
+
+
+def run(fixture: dict, latency: float, repeat: int) -> list[dict]:
+    api = FakeICDAPI(fixture, latency)
+    url = api.start()
+    release = fixture["release"]
+    entities = fixture["entities"]
+    codes = [data["code"] for data in entities.values() if data.get("code", "") != ""]
+    chapters = [data["code"] for data in entities.values() if data["classKind"] == "chapter"]
+    results: list[dict] = []
+
+    def report(name: str, median: float, best: float, operations: int, requests: int) -> None:
+        results.append({"benchmark": name, "median_s": median, "min_s": best, "operations": operations, "ops_per_s": operations / median if median > 0 else float("inf"), "requests": requests})
+
+    def newExplorer() -> ICDExplorer:
+        return ICDExplorer("en", "", "", release=release, customUrl=url)
+
+    try:
+        newExplorer() # creates the client, so that its creation is not measured
+
+        # explorer startup: with the release given, with the latest release found through the API or reused from another explorer, and lazy
+        before = api.getRequestCount()
+        median, best = measure(newExplorer, repeat)
+        report("startup (release given)", median, best, 1, (api.getRequestCount() - before) // repeat)
+        before = api.getRequestCount()
+        median, best = measure(lambda: ICDExplorer("en", "", "", customUrl=url, latestReleaseTtl=0), repeat)
+        report("startup (latest release)", median, best, 1, (api.getRequestCount() - before) // repeat)
+        before = api.getRequestCount()
+        median, best = measure(lambda: ICDExplorer("en", "", "", customUrl=url), repeat)
+        report("startup (latest release, reused)", median, best, 1, (api.getRequestCount() - before) // repeat)
+        before = api.getRequestCount()
+        median, best = measure(lambda: ICDExplorer("en", "", "", release=release, customUrl=url, lazy=True), repeat)
+        report("startup (lazy)", median, best, 1, (api.getRequestCount() - before) // repeat)
+
+        # single lookups: the first time a code is looked up (cold) and the following times (warm)
+        sample = codes[:: max(1, len(codes) // 50)][:50]
+        explorers = [newExplorer() for _ in range(repeat)] # one for each repetition, created before the measurements
+        def cold() -> None:
+            explorer = explorers.pop()
+            for code in sample:
+                explorer.getEntityFromCode(code)
+        before = api.getRequestCount()
+        median, best = measure(cold, repeat)
+        report("single lookup, cold (getEntityFromCode)", median / len(sample), best / len(sample), 1, (api.getRequestCount() - before) // (repeat * len(sample)))
+        explorer = newExplorer()
+        for code in sample:
+            explorer.getEntityFromCode(code)
+        before = api.getRequestCount()
+        median, best = measure(lambda: [explorer.getEntityFromCode(code) for code in sample], repeat)
+        report("single lookup, warm (getEntityFromCode)", median / len(sample), best / len(sample), 1, (api.getRequestCount() - before) // (repeat * len(sample)))
+
+        # bulk lookups of all the codes, one at a time and concurrently
+        bulk = codes[:1000]
+        def sequential() -> None:
+            explorer = newExplorer()
+            for code in bulk:
+                explorer.getEntityFromCode(code)
+        before = api.getRequestCount()
+        median, best = measure(sequential, repeat)
+        report("bulk lookup, sequential (%d codes)" % len(bulk), median, best, len(bulk), (api.getRequestCount() - before) // repeat)
+        before = api.getRequestCount()
+        median, best = measure(lambda: newExplorer().getEntitiesFromCodes(bulk), repeat)
+        report("bulk lookup, getEntitiesFromCodes (%d codes)" % len(bulk), median, best, len(bulk), (api.getRequestCount() - before) // repeat)
+
+        # validation of all the codes, looking them up in the API or reading a SimpleTabulation file first
+        before = api.getRequestCount()
+        median, best = measure(lambda: [explorer.isValidCode(code) for explorer in [newExplorer()] for code in codes], repeat)
+        report("validation of all the codes, API (%d codes)" % len(codes), median, best, len(codes), (api.getRequestCount() - before) // repeat)
+        tabulation = os.path.join(tempfile.mkdtemp(), "SimpleTabulation.txt")
+        saveSimpleTabulation(fixture, tabulation)
+        def validateWithTabulation() -> None:
+            explorer = newExplorer()
+            explorer.loadSimpleTabulation(tabulation)
+            for code in codes:
+                explorer.isValidCode(code)
+        before = api.getRequestCount()
+        median, best = measure(validateWithTabulation, repeat)
+        report("validation of all the codes, SimpleTabulation (%d codes)" % len(codes), median, best, len(codes), (api.getRequestCount() - before) // repeat)
+
+        # hierarchy queries on random pairs of codes, with the index of the explorer and by comparing the lists of ancestors
+        explorer = newExplorer()
+        explorer.loadSimpleTabulation(tabulation)
+        loaded = [explorer.getEntityFromCode(code) for code in codes]
+        pairs = [(loaded[i % len(loaded)], loaded[(i * 7919) % len(loaded)]) for i in range(10000)]
+        explorer.getDepth(loaded[0]) # builds the index, so that its construction is measured separately
+        def scanAncestors() -> None:
+            for a, b in pairs:
+                ancestors = {e.getId() for e in [a] + a.getAncestors()}
+                next((e for e in [b] + b.getAncestors() if e.getId() in ancestors), None)
+        median, best = measure(lambda: [explorer.getLowestCommonAncestor(a, b) for a, b in pairs], repeat)
+        report("lowest common ancestor, index (%d pairs)" % len(pairs), median, best, len(pairs), 0)
+        median, best = measure(scanAncestors, repeat)
+        report("lowest common ancestor, getAncestors (%d pairs)" % len(pairs), median, best, len(pairs), 0)
+
+        # roll-up of a column of codes to their chapters, with rollUpCodes() and with the ancestors of each code
+        column = [codes[(i * 7919) % len(codes)] for i in range(100000)]
+        median, best = measure(lambda: explorer.rollUpCodes(column), repeat)
+        report("roll-up to chapters, rollUpCodes (%d codes)" % len(column), median, best, len(column), 0)
+        median, best = measure(lambda: [([e] + e.getAncestors())[-1].getCode() for e in map(explorer.getEntityFromCode, column)], repeat)
+        report("roll-up to chapters, getAncestors (%d codes)" % len(column), median, best, len(column), 0)
+
+        # sizes of the subtrees of all the entities, with the arrays returned by exportArrays() and with getDescendants()
+        arrays = explorer.exportArrays()
+        median, best = measure(explorer.exportArrays, repeat)
+        report("export to arrays (%d entities)" % len(arrays), median, best, len(arrays), 0)
+        median, best = measure(arrays.getSubtreeSizes, repeat)
+        report("subtree sizes, exportArrays (%d entities)" % len(arrays), median, best, len(arrays), 0)
+        exported = [explorer.getEntityFromId(id) for id in arrays.getIds()]
+        median, best = measure(lambda: [len(e.getDescendants()) + 1 for e in exported], repeat)
+        report("subtree sizes, getDescendants (%d entities)" % len(exported), median, best, len(exported), 0)
+        os.remove(tabulation)
+
+        # traversal of the whole subtree of the first chapter, resolving the proxies one at a time and prefetching them level by level
+        size = len(newExplorer().getEntityFromCode(chapters[0]).getDescendants()) + 1
+        before = api.getRequestCount()
+        median, best = measure(lambda: newExplorer().getEntityFromCode(chapters[0]).getDescendants(), repeat)
+        report("subtree traversal, getDescendants (%d entities)" % size, median, best, size, (api.getRequestCount() - before) // repeat)
+
+        def prefetched() -> None:
+            explorer = newExplorer()
+            chapter = explorer.getEntityFromCode(chapters[0])
+            explorer.prefetch(chapter)
+            chapter.getDescendants()
+        before = api.getRequestCount()
+        median, best = measure(prefetched, repeat)
+        report("subtree traversal, prefetch (%d entities)" % size, median, best, size, (api.getRequestCount() - before) // repeat)
+
+        # ancestors of the deepest codes, each with a new explorer, resolving the parents one at a time and looking them up together after listing them with a single request
+        leaves = [code for code in codes if "." in code]
+        leaves = leaves[:: max(1, len(leaves) // 20)][:20]
+        def ancestors(prefetch: bool) -> None:
+            for code in leaves:
+                explorer = newExplorer()
+                entity = explorer.getEntityFromCode(code)
+                if prefetch:
+                    explorer.prefetchAncestors(entity)
+                entity.getAncestors()
+        before = api.getRequestCount()
+        median, best = measure(lambda: ancestors(False), repeat)
+        report("ancestors, getAncestors (%d codes)" % len(leaves), median, best, len(leaves), (api.getRequestCount() - before) // repeat)
+        before = api.getRequestCount()
+        median, best = measure(lambda: ancestors(True), repeat)
+        report("ancestors, prefetchAncestors (%d codes)" % len(leaves), median, best, len(leaves), (api.getRequestCount() - before) // repeat)
+
+        # parsing of the answers and creation of the entities of all the chapters, without HTTP, with each of the available JSON parsers
+        bodies = [json.dumps(data).encode() for data in entities.values()]
+        for name, loads in getDecoders().items():
+            def decodeAndCreate() -> None:
+                explorer = newExplorer()
+                for body in bodies:
+                    explorer._addEntity(loads(body))
+            median, best = measure(decodeAndCreate, repeat)
+            report("decoding and entity creation, %s (%d entities)" % (name, len(bodies)), median, best, len(bodies), 0)
+        for name, loads in getDecoders().items():
+            median, best = measure(lambda: [loads(body) for body in bodies], repeat)
+            report("decoding only, %s (%d entities)" % (name, len(bodies)), median, best, len(bodies), 0)
+
+        # memory used by the entities of all the chapters, once loaded
+        explorer = newExplorer()
+        roots = [explorer.getEntityFromCode(code) for code in chapters]
+        gc.collect()
+        tracemalloc.start()
+        start = tracemalloc.take_snapshot()
+        for root in roots:
+            explorer.prefetch(root)
+        gc.collect()
+        used = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(start, "filename"))
+        tracemalloc.stop()
+        loaded = sum(len(root.getDescendants()) for root in roots)
+        results.append({"benchmark": "memory per entity (%d entities)" % loaded, "bytes_per_entity": used / loaded if loaded > 0 else 0.0})
+    finally:
+        api.stop()
+    return results
+
+
+def printResults(results: list[dict]) -> None:
+    for r in results:
+        if "bytes_per_entity" in r:
+            print("%-55s %12.0f bytes" % (r["benchmark"], r["bytes_per_entity"]))
+        else:
+            print("%-55s %12.3f ms  (min %.3f ms, %10.1f ops/s, %d requests)" % (r["benchmark"], r["median_s"] * 1000, r["min_s"] * 1000, r["ops_per_s"], r["requests"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for simple_icd_11 against a local stand-in for the ICD API")
+    parser.add_argument("--fixture", help="JSON file with the fixture served by the fake API (by default, one is generated)")
+    parser.add_argument("--latency", type=float, default=5.0, help="milliseconds each answer of the fake API is delayed by (0 measures only the overhead of the library)")
+    parser.add_argument("--repeat", type=int, default=5, help="how many times each benchmark is repeated")
+    parser.add_argument("--decoder", choices=list(getDecoders()), help="the JSON parser used by the library (by default, the fastest one installed)")
+    parser.add_argument("--json", action="store_true", help="prints the results as JSON")
+    args = parser.parse_args()
+    if args.decoder is not None:
+        simple_icd_11._loadJson = getDecoders()[args.decoder]
+    fixture = loadFixture(args.fixture) if args.fixture is not None else generateFixture()
+    results = run(fixture, args.latency / 1000, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        printResults(results)
@@ -0,0 +1,236 @@
+# Stand-in for a deployment of the ICD API, used by the benchmarks
+# It serves, from a thread of the current process, the same endpoints that ICDOtherAPIClient uses, answering with the data of a fixture
+# A fixture is a dict (stored as a JSON file) with the name of the "release" and, for each id, the JSON returned by the API for that entity
+# Fixtures can be recorded from a real deployment with recordFixture(), or generated with generateFixture()
+
+from __future__ import annotations
+from typing import Dict, Any
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, unquote, parse_qs
+import json, random, threading, time
+from simple_icd_11 import ICDAPIClient, ICDOtherAPIClient
+
+_BASE_URI = "http://id.who.int/icd/release/11/"
+
+
+# HTTP server that answers with the data of a fixture
+# latency is the number of seconds each answer is delayed by, to simulate the distance from the API
+class FakeICDAPI:
+    def __init__(self, fixture: dict, latency: float = 0.0) -> None:
+        self.__release: str = fixture["release"]
+        self.__data: Dict[str, dict] = fixture["entities"]
+        self.__entities: Dict[str, bytes] = {id: json.dumps(data).encode() for id, data in fixture["entities"].items()}
+        self.__codes: Dict[str, str] = {data["code"]: id for id, data in fixture["entities"].items() if data.get("code", "") != ""}
+        self.__latency = latency
+        self.__requests = 0
+        self.__lock = threading.Lock()
+        self.__server: ThreadingHTTPServer | None = None
+
+    # Starts the server on a free port of localhost, and returns its URL, to be used as the customUrl of an explorer
+    def start(self) -> str:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keeps connections alive, like the real API
+            disable_nagle_algorithm = True # otherwise small answers are delayed by the TCP stack
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_HEAD(self) -> None:
+                self.__send(405, b"")
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                status, body = api._answer(unquote(url.path), parse_qs(url.query).get("include", [""])[0])
+                self.__send(status, body)
+
+            def __send(self, status: int, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return "http://127.0.0.1:" + str(self.__server.server_address[1]) + "/"
+
+    def stop(self) -> None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    # Returns the number of GET requests answered since the server was created
+    def getRequestCount(self) -> int:
+        return self.__requests
+
+    # Returns the status and the body of the answer to a GET request for path, with the given value of the include parameter
+    def _answer(self, path: str, include: str = "") -> tuple[int, bytes]:
+        with self.__lock:
+            self.__requests += 1
+        if self.__latency > 0:
+            time.sleep(self.__latency)
+        parts = path.strip("/").split("/")
+        if parts[:3] != ["icd", "release", "11"]:
+            return 404, b""
+        parts = parts[3:]
+        if parts == ["mms"]:
+            return 200, json.dumps({"release": [_BASE_URI + self.__release + "/mms"]}).encode()
+        if len(parts) < 2 or parts[0] != self.__release or parts[1] != "mms":
+            return 404, b""
+        if len(parts) == 2:
+            return 200, json.dumps({"title": {"@language": "en", "@value": "ICD-11 for Mortality and Morbidity Statistics"}}).encode()
+        if parts[2] == "codeinfo" and len(parts) == 4:
+            if parts[3] not in self.__codes:
+                return 404, b""
+            return 200, json.dumps({"code": parts[3], "stemId": _BASE_URI + self.__release + "/mms/" + self.__codes[parts[3]]}).encode()
+        id = "/".join(parts[2:])
+        if id not in self.__entities:
+            return 404, b""
+        if "ancestor" not in include and "descendant" not in include:
+            return 200, self.__entities[id]
+        data = dict(self.__data[id])
+        if "ancestor" in include: # like the real API, the list ends with the root of the classification and is omitted if empty
+            data["ancestor"] = []
+            current = self.__data[id]
+            while "parent" in current:
+                data["ancestor"].append(current["parent"][0])
+                current = self.__data.get(current["parent"][0].split("/mms/")[1], {})
+            data["ancestor"].append(_BASE_URI + self.__release + "/mms")
+        if "descendant" in include and "child" in data:
+            data["descendant"] = []
+            frontier = data["child"]
+            while len(frontier) > 0:
+                data["descendant"].extend(frontier)
+                frontier = [c for uri in frontier for c in self.__data.get(uri.split("/mms/")[1], {}).get("child", [])]
+        return 200, json.dumps(data).encode()
+
+
+def loadFixture(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def saveFixture(fixture: dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f)
+
+
+# Writes the entities of a fixture as a SimpleTabulation file (tab-separated, with the columns used by ICDExplorer.loadSimpleTabulation()), in depth-first order
+def saveSimpleTabulation(fixture: dict, path: str) -> None:
+    entities: Dict[str, dict] = fixture["entities"]
+    lines = ["Foundation URI\tLinearization (release) URI\tCode\tBlockId\tTitle\tClassKind\tDepthInKind\tIsResidual"]
+
+    def visit(id: str, depth: int) -> None:
+        data = entities[id]
+        lines.append("\t".join([data.get("source", ""), "http://id.who.int/icd/release/11/mms/" + id, data["code"], data.get("blockId", ""),
+                                "- " * depth + data["title"]["@value"], data["classKind"], "", str("other" in id or "unspecified" in id)]))
+        for child in data.get("child", []):
+            childId = child.split("/mms/")[1]
+            if childId in entities:
+                visit(childId, depth + 1)
+
+    for id, data in entities.items():
+        if data["classKind"] == "chapter":
+            visit(id, 0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# Records a fixture from a real API, starting from the chapters with the given codes and following the links to their children
+# At most maxEntities entities are recorded; the other entities they link to are then missing from the fixture
+def recordFixture(client: ICDAPIClient, release: str, language: str, chapterCodes: list[str], maxEntities: int = 5000) -> dict:
+    entities: Dict[str, dict] = {}
+    queue = [client.lookupCode(code, release, language) for code in chapterCodes]
+    while len(queue) > 0 and len(entities) < maxEntities:
+        data = queue.pop(0)
+        id = data["@id"].split("/mms/")[1]
+        if id in entities:
+            continue
+        entities[id] = data
+        for child in data.get("child", []):
+            childId = child.split("/mms/")[1]
+            if childId not in entities and len(entities) + len(queue) < maxEntities:
+                queue.append(client.lookupId(childId, release, language))
+    return {"release": release, "entities": entities}
+
+
+# Generates a fixture with the same structure as the real classification: chapters containing blocks, which contain categories with
+# subcategories (including the residual ones); the data of the entities has the same fields as the data returned by the API
+# The result only depends on the arguments, so that the benchmarks can be repeated
+def generateFixture(chapters: int = 12, blocksPerChapter: int = 4, categoriesPerBlock: int = 10, subcategoriesPerCategory: int = 3, release: str = "2024-01", seed: int = 11) -> dict:
+    rng = random.Random(seed)
+    words = ["disease", "disorder", "acute", "chronic", "infection", "syndrome", "primary", "secondary", "due to", "of", "the", "with", "without",
+             "neoplasm", "injury", "lesion", "congenital", "malformation", "specified", "site", "unspecified", "other", "complication", "failure"]
+    entities: Dict[str, dict] = {}
+    usedIds: set[str] = set()
+
+    def newId() -> str:
+        while True:
+            id = str(rng.randint(10000000, 2147483647))
+            if id not in usedIds:
+                usedIds.add(id)
+                return id
+
+    def text(n: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(n)).capitalize()
+
+    def add(id: str, code: str, title: str, classKind: str, parentId: str | None, **fields: Any) -> dict:
+        data: Dict[str, Any] = {
+            "@context": "http://id.who.int/icd/contexts/contextForLinearizationEntity.json",
+            "@id": _BASE_URI + release + "/mms/" + id,
+            "source": "http://id.who.int/icd/entity/" + id.split("/")[0],
+            "code": code,
+            "title": {"@language": "en", "@value": title},
+            "classKind": classKind,
+            "browserUrl": "https://icd.who.int/browse/" + release + "/mms/en#" + id,
+        }
+        if parentId is not None:
+            data["parent"] = [_BASE_URI + release + "/mms/" + parentId]
+            entities[parentId].setdefault("child", []).append(data["@id"])
+        data.update(fields)
+        entities[id] = data
+        return data
+
+    def ref(id: str) -> dict:
+        return {"label": {"@language": "en", "@value": text(3)}, "linearizationReference": _BASE_URI + release + "/mms/" + id}
+
+    categoryIds: list[str] = []
+    chapterChars = "123456789ABCDEFGHJKLMNPQRSTUVWXYZ"
+    for c in range(chapters):
+        chapterId = newId()
+        add(chapterId, "%02d" % (c + 1), text(4), "chapter", None, definition={"@language": "en", "@value": text(30)})
+        for b in range(blocksPerChapter):
+            stem = chapterChars[c] + chr(ord("A") + b)
+            blockId = newId()
+            add(blockId, "", text(5), "block", chapterId, blockId="BlockL1-" + stem + "0", codeRange=stem + "00-" + stem + "0Z",
+                codingNote={"@language": "en", "@value": text(12)})
+            for k in range(categoriesPerBlock):
+                code = stem + "0" + "0123456789ABCDEFGHJKLMNPQRSTUVWX"[k]
+                categoryId = newId()
+                categoryIds.append(categoryId)
+                add(categoryId, code, text(5), "category", blockId,
+                    definition={"@language": "en", "@value": text(40)},
+                    indexTerm=[{"label": {"@language": "en", "@value": text(4)}, "foundationReference": "http://id.who.int/icd/entity/" + newId()} for _ in range(3)],
+                    exclusion=[ref(rng.choice(categoryIds))] if len(categoryIds) > 1 else [])
+                for j in range(subcategoriesPerCategory):
+                    add(newId(), code + "." + str(j), text(6), "category", categoryId,
+                        definition={"@language": "en", "@value": text(25)},
+                        inclusion=[{"label": {"@language": "en", "@value": text(4)}}])
+                add(categoryId + "/other", code + ".Y", "Other specified " + text(3).lower(), "category", categoryId)
+                add(categoryId + "/unspecified", code + ".Z", text(3) + ", unspecified", "category", categoryId)
+    return {"release": release, "entities": entities}
+
+
+# Records a fixture from a deployment of the API at url (for example a Docker container), see recordFixture()
+# Usage: python fake_icd_api.py <url> <release> <output file> [chapter codes...]
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 4:
+        print("Usage: python fake_icd_api.py <url> <release> <output file> [chapter codes...]")
+        sys.exit(1)
+    codes = sys.argv[4:] if len(sys.argv) > 4 else ["01", "02"]
+    saveFixture(recordFixture(ICDOtherAPIClient(sys.argv[1]), sys.argv[2], "en", codes), sys.argv[3])
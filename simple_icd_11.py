@@ -3,11 +3,29 @@
 # Read the full LICENCES at https://github.com/StefanoTrv/simple_icd_11/blob/master/LICENSE
 
 from __future__ import annotations
-from typing import Dict
-import requests, json
+from typing import Dict, Callable, Any, Iterable, Iterator, Awaitable
+import requests, json, threading, asyncio, sqlite3, os, sys, time, random, hashlib, csv
+from email.utils import parsedate_to_datetime
+from collections import deque, OrderedDict
+from bisect import bisect_left, bisect_right
+from array import array
+from concurrent.futures import ThreadPoolExecutor, Future
+from requests.adapters import HTTPAdapter
 from abc import ABC, abstractmethod
 
-__all__ = ["ICDExplorer","Entity","PostcoordinationAxis"] #exports only the needed classes
+__all__ = ["ICDExplorer","AsyncICDExplorer","Entity","PostcoordinationAxis","LinearizationArrays"] #exports only the needed classes
+
+# Function used to parse the JSON answers of the API, directly from the bytes of the body (and from the strings stored in cache and snapshot files)
+# If orjson or msgspec is installed, its faster parser is used; otherwise, the standard json module is used
+try:
+    import orjson
+    _loadJson: Callable[[bytes | str], Any] = orjson.loads
+except ImportError:
+    try:
+        import msgspec
+        _loadJson = msgspec.json.decode
+    except ImportError:
+        _loadJson = json.loads
 
 # Abstract class that represents the code that actually interacts with the API
 # All methods in this class and its subclasses can raise ConnectionError at any point if an unresolvable error occurs when trying to communicate with the API
@@ -19,12 +37,25 @@ class ICDAPIClient(ABC):
     def lookupCode(self, code: str, release: str, language: str) -> dict:
         raise NotImplementedError()
 
+    # Abstract method that returns the id of the entity with code code, without retrieving the rest of its data
+    # Raises LookupError if it finds no entity with that code
+    @abstractmethod
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        raise NotImplementedError()
+
     # Abstract method that returns a dict containing the data of the entity with id id
     # Raises LookupError if it finds no entity with that id
     @abstractmethod
     def lookupId(self, id: str, release: str, language: str) -> dict:
         raise NotImplementedError()
 
+    # Abstract method that returns the ids of the ancestors (if relation is "ancestor") or of the descendants (if relation is "descendant") of the entity with id id,
+    # without retrieving their data; returns None if the API doesn't list them, in which case they can only be found by following the parents or the children
+    # Raises LookupError if it finds no entity with that id
+    @abstractmethod
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        raise NotImplementedError()
+
     # Abstract method that returns the name of the latest available release in the given language
     @abstractmethod
     def getLatestRelease(self, language: str) -> str:
@@ -37,63 +68,217 @@ class ICDAPIClient(ABC):
 
 
 
+# Returns the ids listed in the field relation ("ancestor" or "descendant") of the data returned by the API with the include parameter, or None if the list is missing
+# The API omits empty lists, so a missing list is only a problem if the entity has a parent (other than the root of the classification) or children
+def _getRelatedIds(data: dict, relation: str) -> list[str] | None:
+    if relation in data:
+        return [uri.split("/mms/")[1] for uri in data[relation] if "/mms/" in uri] # the root of the classification is not an entity
+    if (relation == "ancestor" and data.get("classKind") == "chapter") or (relation == "descendant" and "child" not in data):
+        return []
+    return None
+
+
+
+# Creates the HTTP session used by an API client, so that connections are pooled and kept alive between requests
+# poolConnections is the number of hosts whose connections are pooled, poolMaxSize the number of connections kept for each host
+# The session can be shared by multiple threads: if more than poolMaxSize threads use it at once, the extra connections are not kept alive
+# The requests sent through the session are limited to requestsPerSecond (if not None) and retried up to maxRetries times, see _ScheduledSession
+def _createSession(poolConnections: int, poolMaxSize: int, keepAlive: bool, requestsPerSecond: float | None = None, maxRetries: int = 3) -> _ScheduledSession:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=poolConnections, pool_maxsize=poolMaxSize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keepAlive:
+        session.headers["Connection"] = "close"
+    return _ScheduledSession(session, _TokenBucket(requestsPerSecond) if requestsPerSecond is not None else None, maxRetries)
+
+
+# Token bucket that limits the rate of the requests: it holds up to capacity tokens (by default, one second's worth), and gains rate tokens per second
+# Each request takes a token; when there are none left, the request waits for its turn. It can be shared by multiple threads
+class _TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("The rate of the requests must be positive.")
+        self.__rate = rate
+        self.__capacity = capacity if capacity is not None else max(1.0, rate)
+        self.__tokens = self.__capacity
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    # Takes a token, waiting until it's available
+    # The token is reserved immediately (the count can go below zero), so that the waiting threads are served in order
+    def acquire(self) -> None:
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__last) * self.__rate) - 1
+            self.__last = now
+            wait = -self.__tokens / self.__rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+# Wrapper of a requests.Session that schedules the requests of an API client
+# If a bucket is given, each request (including each retry) waits for a token from it
+# The requests that fail because of the network or with one of the statuses in RETRY_STATUSES are retried up to maxRetries times,
+# waiting for the time in the Retry-After header if there is one (up to RETRY_AFTER_MAX), and otherwise for an exponential backoff with jitter
+# The last response is returned (or the last network error raised) if all the attempts fail
+class _ScheduledSession:
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    BACKOFF_BASE = 0.5 # seconds before the first retry, doubled at each one
+    BACKOFF_MAX = 30.0
+    RETRY_AFTER_MAX = 60.0 # longer waits asked by the API are cut, so that a wrong or hostile header can't stall the caller
+
+    def __init__(self, session: requests.Session, bucket: _TokenBucket | None, maxRetries: int) -> None:
+        self.__session = session
+        self.__bucket = bucket
+        self.__maxRetries = maxRetries
+
+    def get(self, uri: str, **kwargs: Any) -> requests.Response:
+        return self.__request("GET", uri, **kwargs)
+
+    def post(self, uri: str, **kwargs: Any) -> requests.Response:
+        return self.__request("POST", uri, **kwargs)
+
+    def head(self, uri: str, **kwargs: Any) -> requests.Response:
+        return self.__request("HEAD", uri, **kwargs)
+
+    def __request(self, method: str, uri: str, **kwargs: Any) -> requests.Response:
+        attempt = 0
+        while True:
+            if self.__bucket is not None:
+                self.__bucket.acquire()
+            try:
+                r = self.__session.request(method, uri, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.__maxRetries:
+                    raise
+                r = None
+            if r is not None and (r.status_code not in self.RETRY_STATUSES or attempt >= self.__maxRetries):
+                return r
+            time.sleep(self.__getDelay(r, attempt))
+            attempt += 1
+
+    # Returns how many seconds to wait before retrying after response r (None for a network error)
+    def __getDelay(self, r: requests.Response | None, attempt: int) -> float:
+        if r is not None and "Retry-After" in r.headers:
+            retryAfter = r.headers["Retry-After"]
+            try:
+                return min(self.RETRY_AFTER_MAX, max(0.0, float(retryAfter)))
+            except ValueError:
+                pass
+            try:
+                return min(self.RETRY_AFTER_MAX, max(0.0, parsedate_to_datetime(retryAfter).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** attempt)) # "full jitter", so that clients that failed together don't retry together
+
+
 # Class for interrogating the official ICD API
 # Singleton for each clientId
 class ICDOfficialAPIClient(ICDAPIClient):
     _instances: Dict[str, ICDOfficialAPIClient] = {}
+    LOCATION_URL = "http://id.who.int/icd/release/11/"
+    TOKEN_REFRESH_MARGIN = 60 # seconds before its expiration when a token is replaced, so that requests are not rejected because of an expired token
 
-    def __new__(cls, clientId: str, clientSecret: str):
+    def __new__(cls, clientId: str, clientSecret: str, *args, **kwargs):
         if clientId not in cls._instances:
             return super(ICDOfficialAPIClient, cls).__new__(cls)
         elif cls._instances[clientId]._clientSecret != clientSecret: # Raises error if clientSecret is wrong
             raise ConnectionError("Provided clientSecret is not consistent with previously provided correct secret.")
         return cls._instances[clientId]
 
-    def __init__(self, clientId: str, clientSecret: str):
+    # The connection pool, scheduling and token file settings are only used when the instance for clientId is first created
+    # If tokenFile is given, the tokens are stored in that file (a SQLite database) and shared with the other processes using it
+    def __init__(self, clientId: str, clientSecret: str, poolConnections: int = 10, poolMaxSize: int = 10, keepAlive: bool = True, requestsPerSecond: float | None = None, maxRetries: int = 3, tokenFile: str | None = None):
         # Avoid re-initializing an existing instance
         if not hasattr(self, "_clientId"): # Check if the instance is being initialized for the first time
-            self._locationUrl = "http://id.who.int/icd/release/11/"
+            self._locationUrl = self.LOCATION_URL
             self._clientId = clientId
             self._clientSecret = clientSecret
-            self.__authenticate()
+            self.__session = _createSession(poolConnections, poolMaxSize, keepAlive, requestsPerSecond, maxRetries)
+            self.__tokenFile = tokenFile
+            self.__token = ""
+            self.__tokenExpiration = 0.0 # as returned by time.time(), so that it can be compared with the expirations stored by other processes
+            self.__authLock = threading.Lock()
+            self.__getToken()
             type(self)._instances[clientId] = self # Adds only authenticated Clients to map
 
-    # Uses the credentials to create a new token
-    def __authenticate(self):
+    # Returns a valid token, replacing the current one if it expires within TOKEN_REFRESH_MARGIN seconds
+    # If oldToken is given, a request made with it was rejected: a new token is created, unless another thread or process already replaced oldToken
+    def __getToken(self, oldToken: str | None = None) -> str:
+        if oldToken is None and time.time() < self.__tokenExpiration - self.TOKEN_REFRESH_MARGIN:
+            return self.__token
+        with self.__authLock:
+            if self.__token != oldToken and time.time() < self.__tokenExpiration - self.TOKEN_REFRESH_MARGIN: # another thread already replaced it
+                return self.__token
+            if self.__tokenFile is None:
+                self.__token, self.__tokenExpiration = self.__authenticate()
+            else:
+                self.__token, self.__tokenExpiration = self.__getSharedToken(oldToken)
+            return self.__token
+
+    # Returns the token stored in the token file if it's still valid, otherwise creates a new one and stores it
+    # The database stays locked while the token is created, so that the other processes wait for it instead of authenticating too
+    # Tokens are only shared between clients with the same credentials: the file stores a hash of the secret, never the secret itself
+    def __getSharedToken(self, oldToken: str | None) -> tuple[str, float]:
+        secretHash = hashlib.sha256(self._clientSecret.encode()).hexdigest()
+        if not os.path.exists(self.__tokenFile): # type: ignore
+            os.close(os.open(self.__tokenFile, os.O_CREAT | os.O_WRONLY, 0o600)) # type: ignore # only readable by its owner, since it contains the tokens
+        connection = sqlite3.connect(self.__tokenFile, timeout=60, isolation_level=None) # type: ignore
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS tokens (clientId TEXT PRIMARY KEY, secretHash TEXT, token TEXT, expiration REAL)")
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT token, expiration FROM tokens WHERE clientId = ? AND secretHash = ?", (self._clientId, secretHash)).fetchone()
+            if row is not None and row[0] != oldToken and time.time() < row[1] - self.TOKEN_REFRESH_MARGIN:
+                connection.execute("COMMIT")
+                return row[0], row[1]
+            token, expiration = self.__authenticate()
+            connection.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)", (self._clientId, secretHash, token, expiration))
+            connection.execute("COMMIT")
+            return token, expiration
+        finally:
+            connection.close() # rolls back the transaction if the authentication failed
+
+    # Uses the credentials to create a new token, and returns it together with its expiration time
+    def __authenticate(self) -> tuple[str, float]:
         payload = {"client_id": self._clientId,
                    "client_secret": self._clientSecret,
                    "scope": "icdapi_access",
                    "grant_type": "client_credentials"}
-        r = requests.post("https://icdaccessmanagement.who.int/connect/token", data=payload).json()
+        r = self.__session.post("https://icdaccessmanagement.who.int/connect/token", data=payload).json()
         if "error" in r:
             raise ConnectionError("Authentication attempt with official API ended with an error. Error details: "+r["error"])
-        self.__token = r["access_token"]
+        return r["access_token"], time.time() + r.get("expires_in", 3600)
 
     def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.lookupId(self.lookupCodeId(code, release, language), release, language)
+
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
         uri = self._locationUrl + release + "/mms/codeinfo/" + code
-        headers = {"Authorization": "Bearer " + self.__token,
+        token = self.__getToken()
+        headers = {"Authorization": "Bearer " + token,
                    "Accept": "application/json",
                    "Accept-Language": language,
                    "API-Version": "v2",
                    "linearizationname": "mms",
                    "releaseId": release,
                    "code": code}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 401:
-            self.__authenticate()
-            headers["Authorization"] = "Bearer " + self.__token
-            r = requests.get(uri, headers=headers)
+            headers["Authorization"] = "Bearer " + self.__getToken(token)
+            r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             raise LookupError("No ICD-11 entity with code " + code + " was found for release " + release + " in language " + language + ".")
         elif r.status_code == 200:
-            j = json.loads(r.text)
-            return self.lookupId(j["stemId"].split("/mms/")[1], release, language)
+            j = _loadJson(r.content)
+            return j["stemId"].split("/mms/")[1]
         else:
             raise ConnectionError("Error happened while finding entity for code " + code + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
 
     def lookupId(self, id: str, release: str, language: str) -> dict:
         uri = self._locationUrl + release + "/mms/" + id + "?include=diagnosticCriteria"
-        headers = {"Authorization": "Bearer " + self.__token,
+        token = self.__getToken()
+        headers = {"Authorization": "Bearer " + token,
                    "Accept": "application/json",
                    "Accept-Language": language,
                    "API-Version": "v2",
@@ -101,32 +286,53 @@ class ICDOfficialAPIClient(ICDAPIClient):
                    "releaseId": release,
                    "id": id,
                    "include": "diagnosticCriteria"}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 401:
-            self.__authenticate()
-            headers["Authorization"] = "Bearer " + self.__token
-            r = requests.get(uri, headers=headers)
+            headers["Authorization"] = "Bearer " + self.__getToken(token)
+            r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             raise LookupError("No ICD-11 entity with id " + id + " was found for release " + release + " in language " + language + ".")
         elif r.status_code == 200:
-            return json.loads(r.text)
+            return _loadJson(r.content)
         else:
             raise ConnectionError("Error happened while finding entity for id " + id + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
 
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        uri = self._locationUrl + release + "/mms/" + id + "?include=" + relation
+        token = self.__getToken()
+        headers = {"Authorization": "Bearer " + token,
+                   "Accept": "application/json",
+                   "Accept-Language": language,
+                   "API-Version": "v2",
+                   "linearizationname": "mms",
+                   "releaseId": release,
+                   "id": id,
+                   "include": relation}
+        r = self.__session.get(uri, headers=headers)
+        if r.status_code == 401:
+            headers["Authorization"] = "Bearer " + self.__getToken(token)
+            r = self.__session.get(uri, headers=headers)
+        if r.status_code == 404:
+            raise LookupError("No ICD-11 entity with id " + id + " was found for release " + release + " in language " + language + ".")
+        elif r.status_code == 200:
+            return _getRelatedIds(_loadJson(r.content), relation)
+        else:
+            raise ConnectionError("Error happened while finding the " + relation + "s of entity with id " + id + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
+
     def getLatestRelease(self, language: str) -> str:
         uri = self._locationUrl + "mms"
-        headers = {"Authorization": "Bearer " + self.__token,
+        token = self.__getToken()
+        headers = {"Authorization": "Bearer " + token,
                    "Accept": "application/json",
                    "Accept-Language": language,
                    "API-Version": "v2",
                    "linearizationname": "mms"}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 401:
-            self.__authenticate()
-            headers["Authorization"] = "Bearer " + self.__token
-            r = requests.get(uri, headers=headers)
+            headers["Authorization"] = "Bearer " + self.__getToken(token)
+            r = self.__session.get(uri, headers=headers)
         if r.status_code == 200:
-            j = json.loads(r.text)
+            j = _loadJson(r.content)
             return j["release"][0].split("/11/")[1].split("/")[0]
         elif r.status_code == 404:
             raise LookupError("Could not find any release for language " + language + ". More details: \"" + r.text + "\"")
@@ -135,17 +341,17 @@ class ICDOfficialAPIClient(ICDAPIClient):
 
     def checkRelease(self, release: str, language: str) -> bool:
         uri = self._locationUrl + release + "/mms"
-        headers = {"Authorization": "Bearer " + self.__token,
+        token = self.__getToken()
+        headers = {"Authorization": "Bearer " + token,
                    "Accept": "application/json",
                    "Accept-Language": language,
                    "API-Version": "v2",
                    "linearizationname": "mms",
                    "releaseId": release}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 401:
-            self.__authenticate()
-            headers["Authorization"] = "Bearer " + self.__token
-            r = requests.get(uri, headers=headers)
+            headers["Authorization"] = "Bearer " + self.__getToken(token)
+            r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             return False
         elif r.status_code == 200:
@@ -162,22 +368,33 @@ class ICDOtherAPIClient(ICDAPIClient):
 
     def __new__(cls, locationUrl: str, *args, **kwargs):
         if locationUrl not in cls._instances:
-            cls._instances[locationUrl] = super(ICDOtherAPIClient, cls).__new__(cls)
+            return super(ICDOtherAPIClient, cls).__new__(cls)
         return cls._instances[locationUrl]
 
-    def __init__(self, locationUrl: str):
+    # The connection pool and scheduling settings are only used when the instance for locationUrl is first created
+    def __init__(self, locationUrl: str, poolConnections: int = 10, poolMaxSize: int = 10, keepAlive: bool = True, requestsPerSecond: float | None = None, maxRetries: int = 3):
         # Avoid re-initializing an existing instance
         if not hasattr(self, "_locationUrl"): # Check if the instance is being initialized for the first time
-            self._locationUrl = locationUrl + "icd/release/11/"
+            self._locationUrl = self._getLocationUrl(locationUrl)
+            self.__session = _createSession(poolConnections, poolMaxSize, keepAlive, requestsPerSecond, maxRetries)
             #checks if destination url is responsive
             try:
-                r = requests.head(locationUrl + "icd/entity")
+                r = self.__session.head(locationUrl + "icd/entity")
                 if r.status_code != 405:
                     raise ConnectionError("Error happened while trying to connect with url \"" + self._locationUrl +"\". Error code " + str(r.status_code) + " - details:\n\"" + r.text + "\"")
             except Exception as e:
                 raise ConnectionError("Error happened while trying to connect with url \"" + self._locationUrl +"\" - details:\n\"" + str(e) + "\"")
+            type(self)._instances[locationUrl] = self # Adds only responsive Clients to map, so that a failed connection can be retried
+
+    # Returns the URL of the releases of ICD-11 in the deployment at locationUrl, that is the value of _locationUrl
+    @staticmethod
+    def _getLocationUrl(locationUrl: str) -> str:
+        return locationUrl + "icd/release/11/"
 
     def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.lookupId(self.lookupCodeId(code, release, language), release, language)
+
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
         uri = self._locationUrl + release + "/mms/codeinfo/" + code
         headers = {"Authorization": "",
                    "Accept": "application/json",
@@ -186,12 +403,12 @@ class ICDOtherAPIClient(ICDAPIClient):
                    "linearizationname": "mms",
                    "releaseId": release,
                    "code": code}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             raise LookupError("No ICD-11 entity with code " + code + " was found for release " + release + " in language " + language + ".")
         elif r.status_code == 200:
-            j = json.loads(r.text)
-            return self.lookupId(j["stemId"].split("/mms/")[1], release, language)
+            j = _loadJson(r.content)
+            return j["stemId"].split("/mms/")[1]
         else:
             raise ConnectionError("Error happened while finding entity for code " + code + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
 
@@ -205,17 +422,35 @@ class ICDOtherAPIClient(ICDAPIClient):
                    "releaseId": release,
                    "id": id,
                    "include": "diagnosticCriteria"}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             raise LookupError("No ICD-11 entity with id " + id + " was found for release " + release + " in language " + language + ".")
         elif r.status_code == 200:
-            result = json.loads(r.text)
+            result = _loadJson(r.content)
             if "browserUrl" in result:
                 result["browserUrl"] = result["browserUrl"].replace("https://icd.who.int/","http://localhost/")
             return result
         else:
             raise ConnectionError("Error happened while finding entity for id " + id + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
 
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        uri = self._locationUrl + release + "/mms/" + id + "?include=" + relation
+        headers = {"Authorization": "",
+                   "Accept": "application/json",
+                   "Accept-Language": language,
+                   "API-Version": "v2",
+                   "linearizationname": "mms",
+                   "releaseId": release,
+                   "id": id,
+                   "include": relation}
+        r = self.__session.get(uri, headers=headers)
+        if r.status_code == 404:
+            raise LookupError("No ICD-11 entity with id " + id + " was found for release " + release + " in language " + language + ".")
+        elif r.status_code == 200:
+            return _getRelatedIds(_loadJson(r.content), relation)
+        else:
+            raise ConnectionError("Error happened while finding the " + relation + "s of entity with id " + id + ". Error code " + str(r.status_code) + " - details: \n\"" + r.text + "\"")
+
     def getLatestRelease(self, language: str) -> str:
         uri = self._locationUrl + "mms"
         headers = {"Authorization": "",
@@ -223,9 +458,9 @@ class ICDOtherAPIClient(ICDAPIClient):
                    "Accept-Language": language,
                    "API-Version": "v2",
                    "linearizationname": "mms"}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 200:
-            j = json.loads(r.text)
+            j = _loadJson(r.content)
             return j["release"][0].split("/11/")[1].split("/")[0]
         elif r.status_code == 404:
             raise LookupError("Could not find any release for language " + language + ". More details: \"" + r.text + "\"")
@@ -240,7 +475,7 @@ class ICDOtherAPIClient(ICDAPIClient):
                    "API-Version": "v2",
                    "linearizationname": "mms",
                    "releaseId": release}
-        r = requests.get(uri, headers=headers)
+        r = self.__session.get(uri, headers=headers)
         if r.status_code == 404:
             return False
         elif r.status_code == 200:
@@ -250,8 +485,516 @@ class ICDOtherAPIClient(ICDAPIClient):
 
 
 
+# Class that stores the answers of another client in a SQLite database file, so that they are reused after restarts and by other explorers and processes
+# The data of the entities, the code-to-id resolutions and the lists of related ids are stored for each release and language, and are tagged with the location of the API that provided them
+# Since published releases never change, entries never expire: if maxEntries is not None, the oldest entities, codes and lists of related ids are deleted when the database holds more than maxEntries of them
+# The name of the latest release is the only answer that can change: it's stored for latestReleaseTtl seconds (0 means that it's never stored)
+# The database can be safely shared by multiple threads and processes
+class ICDCachedAPIClient(ICDAPIClient):
+    def __init__(self, client: ICDAPIClient, path: str, maxEntries: int | None = None, latestReleaseTtl: float = 0) -> None:
+        self.__client = client
+        self._locationUrl: str = client._locationUrl # type: ignore
+        self.__source = self._locationUrl
+        self.__path = path
+        self.__maxEntries = maxEntries
+        self.__latestReleaseTtl = latestReleaseTtl
+        self.__local = threading.local()
+        connection = self.__getConnection() # creates the tables and checks that the file can be used
+        # the number of rows of each bounded table when it was last counted, plus the rows inserted since then by this client
+        self.__counts: Dict[str, int] = {}
+        if maxEntries is not None:
+            self.__counts = {table: connection.execute("SELECT COUNT(*) FROM " + table).fetchone()[0] for table in ("entities", "codes", "relatedIds")}
+        self.__countsLock = threading.Lock()
+
+    # Returns the connection of the current thread, creating it if needed (SQLite connections can't be shared by threads or processes)
+    def __getConnection(self) -> sqlite3.Connection:
+        if getattr(self.__local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.__path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS entities (source TEXT, release TEXT, language TEXT, id TEXT, data TEXT, PRIMARY KEY (source, release, language, id))")
+            connection.execute("CREATE TABLE IF NOT EXISTS codes (source TEXT, release TEXT, language TEXT, code TEXT, id TEXT, PRIMARY KEY (source, release, language, code))")
+            connection.execute("CREATE TABLE IF NOT EXISTS releases (source TEXT, release TEXT, language TEXT, PRIMARY KEY (source, release, language))")
+            connection.execute("CREATE TABLE IF NOT EXISTS latestReleases (source TEXT, language TEXT, release TEXT, time REAL, PRIMARY KEY (source, language))")
+            connection.execute("CREATE TABLE IF NOT EXISTS relatedIds (source TEXT, release TEXT, language TEXT, id TEXT, relation TEXT, ids TEXT, PRIMARY KEY (source, release, language, id, relation))")
+            self.__local.connection = connection
+            self.__local.pid = os.getpid()
+        return self.__local.connection
+
+    # Stores a row in one of the tables bounded by maxEntries: when the table may have exceeded it, the oldest rows are deleted
+    # A tenth of maxEntries more rows than needed is deleted, so that the table is counted and trimmed once every many insertions instead of at each one
+    def __store(self, table: str, values: tuple) -> None:
+        connection = self.__getConnection()
+        connection.execute("INSERT OR REPLACE INTO " + table + " VALUES (" + ", ".join("?" * len(values)) + ")", values)
+        if self.__maxEntries is None:
+            return
+        with self.__countsLock:
+            self.__counts[table] += 1
+            if self.__counts[table] <= self.__maxEntries:
+                return
+            count = connection.execute("SELECT COUNT(*) FROM " + table).fetchone()[0] # the rows added by other processes are counted too
+            excess = max(0, count - self.__maxEntries + self.__maxEntries // 10)
+            connection.execute("DELETE FROM " + table + " WHERE rowid IN (SELECT rowid FROM " + table + " ORDER BY rowid LIMIT ?)", (excess,))
+            self.__counts[table] = count - excess
+
+    def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.lookupId(self.lookupCodeId(code, release, language), release, language)
+
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        row = self.__getConnection().execute("SELECT id FROM codes WHERE source = ? AND release = ? AND language = ? AND code = ?", (self.__source, release, language, code)).fetchone()
+        if row is not None:
+            return row[0]
+        id = self.__client.lookupCodeId(code, release, language)
+        self.__store("codes", (self.__source, release, language, code, id))
+        return id
+
+    def lookupId(self, id: str, release: str, language: str) -> dict:
+        row = self.__getConnection().execute("SELECT data FROM entities WHERE source = ? AND release = ? AND language = ? AND id = ?", (self.__source, release, language, id)).fetchone()
+        if row is not None:
+            return _loadJson(row[0])
+        data = self.__client.lookupId(id, release, language)
+        self.__store("entities", (self.__source, release, language, id, json.dumps(data)))
+        return data
+
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        row = self.__getConnection().execute("SELECT ids FROM relatedIds WHERE source = ? AND release = ? AND language = ? AND id = ? AND relation = ?", (self.__source, release, language, id, relation)).fetchone()
+        if row is not None:
+            return _loadJson(row[0])
+        ids = self.__client.lookupRelatedIds(id, release, language, relation)
+        if ids is not None:
+            self.__store("relatedIds", (self.__source, release, language, id, relation, json.dumps(ids)))
+        return ids
+
+    # The latest release changes over time, so it's only reused for latestReleaseTtl seconds
+    def getLatestRelease(self, language: str) -> str:
+        if self.__latestReleaseTtl <= 0:
+            return self.__client.getLatestRelease(language)
+        connection = self.__getConnection()
+        row = connection.execute("SELECT release, time FROM latestReleases WHERE source = ? AND language = ?", (self.__source, language)).fetchone()
+        if row is not None and 0 <= time.time() - row[1] < self.__latestReleaseTtl:
+            return row[0]
+        release = self.__client.getLatestRelease(language)
+        connection.execute("INSERT OR REPLACE INTO latestReleases VALUES (?, ?, ?, ?)", (self.__source, language, release, time.time()))
+        return release
+
+    # Only existing releases are cached, since a release that doesn't exist yet could be published in the future
+    def checkRelease(self, release: str, language: str) -> bool:
+        connection = self.__getConnection()
+        if connection.execute("SELECT 1 FROM releases WHERE source = ? AND release = ? AND language = ?", (self.__source, release, language)).fetchone() is not None:
+            return True
+        if self.__client.checkRelease(release, language):
+            connection.execute("INSERT OR REPLACE INTO releases VALUES (?, ?, ?)", (self.__source, release, language))
+            return True
+        return False
+
+
+
+# Returns the data of all the chapters of the release in the given language, in their order
+# ICDAPIClient has no method for listing the chapters, so their codes are tried one by one
+def _lookUpChapters(client: ICDAPIClient, release: str, language: str) -> list[dict]:
+    chapters: list[dict] = []
+    for code in ["%02d" % n for n in range(1, 100)]: # chapters are numbered without gaps
+        try:
+            chapters.append(client.lookupCode(code, release, language))
+        except LookupError:
+            break
+    for code in ["V", "X"]: # supplementary chapters
+        try:
+            chapters.append(client.lookupCode(code, release, language))
+        except LookupError:
+            pass
+    return chapters
+
+
+
+# Reads a SimpleTabulation file of ICD-11 MMS, as published by the WHO for each release (the tab-separated text version, or a comma-separated export if path ends with .csv)
+# The rows are in the order of a depth-first visit of the classification, and the depth of each entity is given by the "- " before its title
+# Returns, for each row, the id, URI, code, title, class kind, block id and depth of the entity
+def _readSimpleTabulation(path: str) -> list[tuple[str, str, str, str, str, str, int]]:
+    rows: list[tuple[str, str, str, str, str, str, int]] = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter="," if path.lower().endswith(".csv") else "\t")
+        columns = {name.strip().lower(): i for i, name in enumerate(next(reader, []))}
+        try:
+            uriColumn = next(i for name, i in columns.items() if name.startswith("linearization") and name.endswith("uri"))
+            codeColumn, blockIdColumn, titleColumn, classKindColumn = columns["code"], columns["blockid"], columns["title"], columns["classkind"]
+        except (StopIteration, KeyError):
+            raise ValueError("File \"" + path + "\" is not a SimpleTabulation file: its first row must contain the columns \"Linearization URI\", \"Code\", \"BlockId\", \"Title\" and \"ClassKind\".")
+        for row in reader:
+            if len(row) <= max(uriColumn, codeColumn, blockIdColumn, titleColumn, classKindColumn) or "/mms/" not in row[uriColumn]:
+                continue
+            title = row[titleColumn].strip()
+            depth = 0
+            while title.startswith("-"):
+                title = title[1:].lstrip()
+                depth += 1
+            uri = row[uriColumn].strip()
+            rows.append((uri.split("/mms/")[1], uri, row[codeColumn].strip(), title, row[classKindColumn].strip(), row[blockIdColumn].strip(), depth))
+    return rows
+
+
+
+# The latest releases found by the explorers of this process, for each location of the API and language, with the time until which they can be reused
+_latestReleases: Dict[tuple[str, str], tuple[str, float]] = {}
+_latestReleasesLock = threading.Lock()
+
+# Returns the latest release in the given language, reusing for ttl seconds the answer obtained by any explorer of this process for the same API
+# If ttl is not positive, the client is always asked, and the answer is not shared with the other explorers
+def _getLatestRelease(client: ICDAPIClient, language: str, ttl: float) -> str:
+    if ttl <= 0:
+        return client.getLatestRelease(language)
+    key = (client._locationUrl, language) # type: ignore
+    with _latestReleasesLock:
+        cached = _latestReleases.get(key)
+    if cached is not None and time.monotonic() < cached[1]:
+        return cached[0]
+    release = client.getLatestRelease(language)
+    with _latestReleasesLock:
+        _latestReleases[key] = (release, time.monotonic() + ttl)
+    return release
+
+
+
+# Proxy of an API client that creates the client (which, for the official API, means authenticating) only when one of its methods is first called
+class _LazyAPIClient(ICDAPIClient):
+    def __init__(self, createClient: Callable[[], ICDAPIClient], locationUrl: str) -> None:
+        self.__createClient = createClient
+        self.__client: ICDAPIClient | None = None
+        self.__lock = threading.Lock()
+        self._locationUrl = locationUrl
+
+    def __getClient(self) -> ICDAPIClient:
+        if self.__client is None:
+            with self.__lock:
+                if self.__client is None: # another thread may have created it while this one was waiting
+                    self.__client = self.__createClient()
+        return self.__client
+
+    def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.__getClient().lookupCode(code, release, language)
+
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        return self.__getClient().lookupCodeId(code, release, language)
+
+    def lookupId(self, id: str, release: str, language: str) -> dict:
+        return self.__getClient().lookupId(id, release, language)
+
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        return self.__getClient().lookupRelatedIds(id, release, language, relation)
+
+    def getLatestRelease(self, language: str) -> str:
+        return self.__getClient().getLatestRelease(language)
+
+    def checkRelease(self, release: str, language: str) -> bool:
+        return self.__getClient().checkRelease(release, language)
+
+
+
+# Class that answers all the requests using a snapshot file, without connecting to any API
+# A snapshot file is a SQLite database containing the data of all the entities of a release in a language, and is created with createSnapshot()
+# The data of the entities is the same that was returned by the client used to create the snapshot
+class ICDSnapshotClient(ICDAPIClient):
+    def __init__(self, path: str) -> None:
+        if not os.path.isfile(path):
+            raise ConnectionError("Snapshot file \"" + path + "\" does not exist.")
+        self.__path = path
+        self.__local = threading.local()
+        try:
+            metadata = dict(self.__getConnection().execute("SELECT key, value FROM metadata").fetchall())
+        except sqlite3.DatabaseError as e:
+            raise ConnectionError("File \"" + path + "\" is not a valid snapshot - details:\n\"" + str(e) + "\"")
+        self._locationUrl = metadata["source"]
+        self.__release = metadata["release"]
+        self.__language = metadata["language"]
+
+    # Returns the connection of the current thread, creating it if needed (SQLite connections can't be shared by threads or processes)
+    def __getConnection(self) -> sqlite3.Connection:
+        if getattr(self.__local, "pid", None) != os.getpid():
+            self.__local.connection = sqlite3.connect("file:" + self.__path + "?mode=ro", uri=True)
+            self.__local.pid = os.getpid()
+        return self.__local.connection
+
+    def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.lookupId(self.lookupCodeId(code, release, language), release, language)
+
+    # Like the API, a combination of codes (with & or /) is mapped to the entity of its stem code, and is found only if all its codes exist
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        row = None
+        if release == self.__release and language == self.__language:
+            connection = self.__getConnection()
+            row = connection.execute("SELECT id FROM codes WHERE code = ?", (code.split("&")[0].split("/")[0],)).fetchone()
+            for c in code.replace("/", "&").split("&")[1:]:
+                if connection.execute("SELECT id FROM codes WHERE code = ?", (c,)).fetchone() is None:
+                    row = None
+        if row is None:
+            raise LookupError("No ICD-11 entity with code " + code + " was found for release " + release + " in language " + language + ".")
+        return row[0]
+
+    def lookupId(self, id: str, release: str, language: str) -> dict:
+        row = None
+        if release == self.__release and language == self.__language:
+            row = self.__getConnection().execute("SELECT data FROM entities WHERE id = ?", (id,)).fetchone()
+        if row is None:
+            raise LookupError("No ICD-11 entity with id " + id + " was found for release " + release + " in language " + language + ".")
+        return _loadJson(row[0])
+
+    # The snapshot contains all the entities, so the lists are built by following the links between them, without any request
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str]:
+        data = self.lookupId(id, release, language)
+        ids: list[str] = []
+        if relation == "ancestor":
+            while data["classKind"] != "chapter":
+                ids.append(data["parent"][0].split("/mms/")[1])
+                data = self.lookupId(ids[-1], release, language)
+        else:
+            frontier = [data]
+            while len(frontier) > 0:
+                children = [c.split("/mms/")[1] for d in frontier for c in d.get("child", [])]
+                ids.extend(children)
+                frontier = [self.lookupId(c, release, language) for c in children]
+        return ids
+
+    def getLatestRelease(self, language: str) -> str:
+        if language != self.__language:
+            raise LookupError("Could not find any release for language " + language + ". The snapshot only contains release " + self.__release + " in language " + self.__language + ".")
+        return self.__release
+
+    def checkRelease(self, release: str, language: str) -> bool:
+        return release == self.__release and language == self.__language
+
+    # Downloads all the entities of the release in the given language using client, and stores them in a new snapshot file at path
+    # The entities are found starting from the chapters and following the links to their children, looking up up to maxWorkers entities at the same time
+    # The file is replaced only when the download is complete
+    @staticmethod
+    def createSnapshot(client: ICDAPIClient, path: str, release: str, language: str, maxWorkers: int = 10) -> None:
+        temporaryPath = path + ".tmp"
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        connection = sqlite3.connect(temporaryPath)
+        try:
+            connection.execute("CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT)")
+            connection.execute("CREATE TABLE entities (id TEXT PRIMARY KEY, data TEXT)")
+            connection.execute("CREATE TABLE codes (code TEXT PRIMARY KEY, id TEXT)")
+            connection.executemany("INSERT INTO metadata VALUES (?, ?)", [("source", client._locationUrl), ("release", release), ("language", language)]) # type: ignore
+            found = set()
+            frontier = _lookUpChapters(client, release, language)
+            with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+                while len(frontier) > 0:
+                    children: list[str] = []
+                    for data in frontier:
+                        id = data["@id"].split("/mms/")[1]
+                        connection.execute("INSERT INTO entities VALUES (?, ?)", (id, json.dumps(data)))
+                        if data["code"] != "":
+                            connection.execute("INSERT OR REPLACE INTO codes VALUES (?, ?)", (data["code"], id))
+                        for c in data.get("child", []):
+                            c_id = c.split("/mms/")[1]
+                            if c_id not in found:
+                                found.add(c_id)
+                                children.append(c_id)
+                    frontier = list(executor.map(lambda c_id: client.lookupId(c_id, release, language), children))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(temporaryPath, path)
+
+
+
+# Class that collects the metrics of an explorer: counters and latency histograms, each identified by a name
+# Every measurement is also passed to the hooks, as hook(kind, name, value) where kind is "count" (value is the increment) or "latency" (value is in seconds)
+# It can be shared by multiple threads
+class _Metrics:
+    LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # upper bounds in seconds
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__counters: Dict[str, int] = {}
+        self.__latencies: Dict[str, list[float]] = {} # for each name, the count of each bucket (plus one for larger values), then the total count and sum
+        self.__hooks: list[Callable[[str, str, float], None]] = []
+
+    def addHook(self, hook: Callable[[str, str, float], None]) -> None:
+        self.__hooks.append(hook)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+        self.__callHooks("count", name, value)
+
+    def recordLatency(self, name: str, seconds: float) -> None:
+        with self.__lock:
+            histogram = self.__latencies.get(name)
+            if histogram is None:
+                histogram = self.__latencies[name] = [0] * (len(self.LATENCY_BUCKETS) + 3)
+            histogram[bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+        self.__callHooks("latency", name, seconds)
+
+    # The hooks are called by the thread that took the measurement, often while a lookup is ending: their errors are ignored, so that they can't change its result
+    def __callHooks(self, kind: str, name: str, value: float) -> None:
+        for hook in self.__hooks:
+            try:
+                hook(kind, name, value)
+            except Exception:
+                pass
+
+    # Returns a copy of the counters and of the histograms; the buckets of a histogram are cumulative, as {upper bound: count of the values not greater than it}
+    def getMetrics(self) -> dict[str, Any]:
+        with self.__lock:
+            latencies: Dict[str, dict[str, Any]] = {}
+            for name, histogram in self.__latencies.items():
+                buckets: Dict[float, int] = {}
+                total = 0
+                for bound, n in zip(self.LATENCY_BUCKETS + (float("inf"),), histogram):
+                    total += n
+                    buckets[bound] = int(total)
+                latencies[name] = {"count": int(histogram[-2]), "sum": histogram[-1], "buckets": buckets}
+            return {"counters": dict(self.__counters), "latencies": latencies}
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__counters.clear()
+            self.__latencies.clear()
+
+
+
+# Class that counts the calls to the methods of another client and measures how long they take
+# The names of the metrics are "api." followed by the name of the method
+class _InstrumentedAPIClient(ICDAPIClient):
+    def __init__(self, client: ICDAPIClient, metrics: _Metrics) -> None:
+        self.__client = client
+        self.__metrics = metrics
+        self._locationUrl: str = client._locationUrl # type: ignore
+
+    def __measure(self, name: str, function: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.__metrics.count("api." + name)
+            self.__metrics.recordLatency("api." + name, time.perf_counter() - start)
+
+    def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return self.__measure("lookupCode", self.__client.lookupCode, code, release, language)
+
+    def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        return self.__measure("lookupCodeId", self.__client.lookupCodeId, code, release, language)
+
+    def lookupId(self, id: str, release: str, language: str) -> dict:
+        return self.__measure("lookupId", self.__client.lookupId, id, release, language)
+
+    def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        return self.__measure("lookupRelatedIds", self.__client.lookupRelatedIds, id, release, language, relation)
+
+    def getLatestRelease(self, language: str) -> str:
+        return self.__measure("getLatestRelease", self.__client.getLatestRelease, language)
+
+    def checkRelease(self, release: str, language: str) -> bool:
+        return self.__measure("checkRelease", self.__client.checkRelease, release, language)
+
+
+
+# Abstract class that represents the asynchronous counterpart of ICDAPIClient
+# Its methods have the same meaning and raise the same errors as the corresponding methods of ICDAPIClient
+class AsyncICDAPIClient(ABC):
+
+    @abstractmethod
+    async def lookupCode(self, code: str, release: str, language: str) -> dict:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def lookupId(self, id: str, release: str, language: str) -> dict:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def getLatestRelease(self, language: str) -> str:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def checkRelease(self, release: str, language: str) -> bool:
+        raise NotImplementedError()
+
+
+
+# Asynchronous client that runs the requests of a synchronous client on its own pool of maxConcurrency threads
+# The event loop is never blocked, and at most maxConcurrency requests are sent to the API at the same time, while the others wait for their turn
+# The synchronous client is created (and, if needed, authenticated) on the pool the first time it is needed
+class _ThreadedAsyncAPIClient(AsyncICDAPIClient):
+    def __init__(self, maxConcurrency: int, requestsPerSecond: float | None, maxRetries: int) -> None:
+        self._maxConcurrency = maxConcurrency
+        self._requestsPerSecond = requestsPerSecond
+        self._maxRetries = maxRetries
+        self.__executor = ThreadPoolExecutor(max_workers=maxConcurrency)
+        self.__client: ICDAPIClient | None = None
+
+    # Returns a new synchronous client, with a connection pool large enough for maxConcurrency threads
+    @abstractmethod
+    def _createClient(self) -> ICDAPIClient:
+        raise NotImplementedError()
+
+    async def __run(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, function, *args)
+
+    async def __getClient(self) -> ICDAPIClient:
+        if self.__client is None:
+            self.__client = await self.__run(self._createClient)
+        return self.__client # type: ignore
+
+    async def lookupCode(self, code: str, release: str, language: str) -> dict:
+        return await self.__run((await self.__getClient()).lookupCode, code, release, language)
+
+    async def lookupCodeId(self, code: str, release: str, language: str) -> str:
+        return await self.__run((await self.__getClient()).lookupCodeId, code, release, language)
+
+    async def lookupId(self, id: str, release: str, language: str) -> dict:
+        return await self.__run((await self.__getClient()).lookupId, id, release, language)
+
+    async def lookupRelatedIds(self, id: str, release: str, language: str, relation: str) -> list[str] | None:
+        return await self.__run((await self.__getClient()).lookupRelatedIds, id, release, language, relation)
+
+    async def getLatestRelease(self, language: str) -> str:
+        return await self.__run((await self.__getClient()).getLatestRelease, language)
+
+    async def checkRelease(self, release: str, language: str) -> bool:
+        return await self.__run((await self.__getClient()).checkRelease, release, language)
+
+
+
+# Asynchronous client for interrogating the official ICD API
+class AsyncICDOfficialAPIClient(_ThreadedAsyncAPIClient):
+    def __init__(self, clientId: str, clientSecret: str, maxConcurrency: int = 10, requestsPerSecond: float | None = None, maxRetries: int = 3, tokenFile: str | None = None) -> None:
+        super().__init__(maxConcurrency, requestsPerSecond, maxRetries)
+        self._clientId = clientId
+        self._clientSecret = clientSecret
+        self._tokenFile = tokenFile
+
+    def _createClient(self) -> ICDAPIClient:
+        return ICDOfficialAPIClient(self._clientId, self._clientSecret, poolMaxSize=self._maxConcurrency, requestsPerSecond=self._requestsPerSecond, maxRetries=self._maxRetries, tokenFile=self._tokenFile)
+
+
+
+# Asynchronous client for interrogating an unofficial ICD API
+class AsyncICDOtherAPIClient(_ThreadedAsyncAPIClient):
+    def __init__(self, locationUrl: str, maxConcurrency: int = 10, requestsPerSecond: float | None = None, maxRetries: int = 3) -> None:
+        super().__init__(maxConcurrency, requestsPerSecond, maxRetries)
+        self._locationUrl = locationUrl
+
+    def _createClient(self) -> ICDAPIClient:
+        return ICDOtherAPIClient(self._locationUrl, poolMaxSize=self._maxConcurrency, requestsPerSecond=self._requestsPerSecond, maxRetries=self._maxRetries)
+
+
+
 # Abstract class representing an ICD-11 MMS entity
+# Entities and their subclasses use __slots__ instead of a __dict__, to reduce the memory needed to keep large parts of the classification loaded
 class Entity(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def getId(self) -> str:
         raise NotImplementedError()
@@ -363,18 +1106,66 @@ class Entity(ABC):
     @abstractmethod
     def _appendExclusion(self, lst: list[Entity]) -> None: # includeFromUpperLevels is omitted from the parameters: it must be true!
         raise NotImplementedError()
+
+    # Lazily yields the descendants of this entity, in the same order as getDescendants() (depth-first) or level by level (breadth-first)
+    # The children of an entity are only retrieved when the iteration reaches them, so stopping early avoids looking up the rest of the subtree
+    # Descendants more than maxDepth levels below this entity are not yielded, and if prune returns True for an entity, neither it nor its descendants are yielded
+    def iterDescendants(self, includeChildrenElsewhere: bool = False, breadthFirst: bool = False, maxDepth: int | None = None, prune: Callable[[Entity], bool] | None = None) -> Iterator[Entity]:
+        if maxDepth is not None and maxDepth < 1:
+            return
+        if breadthFirst:
+            queue = deque((c, 1) for c in self.getChildren(includeChildrenElsewhere=includeChildrenElsewhere))
+            while len(queue) > 0:
+                e, depth = queue.popleft()
+                if prune is not None and prune(e):
+                    continue
+                yield e
+                if maxDepth is None or depth < maxDepth:
+                    queue.extend((c, depth + 1) for c in e.getChildren(includeChildrenElsewhere=includeChildrenElsewhere))
+        else:
+            stack = [iter(self.getChildren(includeChildrenElsewhere=includeChildrenElsewhere))] # the length of the stack is the depth of the next entity
+            while len(stack) > 0:
+                e = next(stack[-1], None)
+                if e is None:
+                    stack.pop()
+                    continue
+                if prune is not None and prune(e):
+                    continue
+                yield e
+                if maxDepth is None or len(stack) < maxDepth:
+                    stack.append(iter(e.getChildren(includeChildrenElsewhere=includeChildrenElsewhere)))
+
+    # Lazily yields the ancestors of this entity, from the closest to the furthest, up to maxDepth levels above it
+    def iterAncestors(self, maxDepth: int | None = None) -> Iterator[Entity]:
+        e = self.getParent()
+        depth = 1
+        while e is not None and (maxDepth is None or depth <= maxDepth):
+            yield e
+            e = e.getParent()
+            depth += 1
     
     def __str__(self) -> str:
         return self.getTitle() + " (" + self.getCode() + " - " + self.getId() + ")\n" + self.getDefinition()
 
 
 
+# Returns t with each occurrence of old replaced by new, or t itself if old does not occur in it
+def _replaceInTuple(t: tuple, old: object, new: object) -> tuple:
+    for e in t:
+        if e is old:
+            return tuple(new if x is old else x for x in t)
+    return t
+
+
+
 # Proxy class for entities that were found in the description of other entities, so that for now we have limited information about them
 class ProxyEntity(Entity):
+    __slots__ = ("__real", "__explorer", "__id", "__uri", "__parent")
+
     def __init__(self, explorer: ICDExplorer, id: str, uri: str, parent: Entity | None = None) -> None:
         self.__real = None
         self.__explorer = explorer
-        self.__id = id
+        self.__id = sys.intern(id)
         self.__uri = uri
         self.__parent = parent
 
@@ -503,6 +1294,13 @@ class ProxyEntity(Entity):
     def _setParent(self, p: Entity) -> None:
         self.__parent = p
 
+    def _setRealEntity(self, real: Entity) -> None:
+        self.__real = real
+
+    # Returns true if the RealEntity of this proxy was already created, so that the entities holding the proxy replace it
+    def _isResolved(self) -> bool:
+        return self.__real is not None
+
     def _appendDescendants(self, includeChildrenElsewhere: bool, lst: list[Entity]) -> None:
         if self.__real is None:
             self.__real = self.__explorer._getRealEntity(self.__id)
@@ -519,9 +1317,110 @@ class ProxyEntity(Entity):
         self.__real._appendExclusion(lst) # type: ignore
 
 
+
+# Proxy class for entities read from a SimpleTabulation file, see ICDExplorer.loadSimpleTabulation()
+# The data listed in the file (code, title, class kind, block id, parent and children) is returned without contacting the API, the rest is looked up when first needed
+# The code is None for blocks when code ranges are used as codes, since the file doesn't contain the code ranges
+class TabulationEntity(ProxyEntity):
+    __slots__ = ("__code", "__title", "__classKind", "__blockId", "__children")
+
+    def __init__(self, explorer: ICDExplorer, id: str, uri: str, code: str | None, title: str, classKind: str, blockId: str, parent: Entity | None) -> None:
+        super().__init__(explorer, id, uri, parent)
+        self.__code = sys.intern(code) if code is not None else None
+        self.__title = title
+        self.__classKind = sys.intern(classKind)
+        self.__blockId = blockId
+        self.__children: tuple[Entity, ...] = ()
+
+    def getCode(self) -> str:
+        if self.__code is None:
+            return super().getCode()
+        return self.__code
+
+    # Returns the code read from the file, or "" if it's not known (see above), without contacting the API
+    def _getKnownCode(self) -> str:
+        return self.__code if self.__code is not None else ""
+
+    def getTitle(self) -> str:
+        return self.__title
+
+    def getBlockId(self) -> str:
+        return self.__blockId
+
+    def getClassKind(self) -> str:
+        return self.__classKind
+
+    def getChildren(self, includeChildrenElsewhere: bool = False) -> list[Entity]:
+        if includeChildrenElsewhere: # the children elsewhere are not listed in the file
+            return super().getChildren(includeChildrenElsewhere = True)
+        return list(self.__children)
+
+    def getDescendants(self, includeChildrenElsewhere: bool = False) -> list[Entity]:
+        lst: list[Entity] = []
+        self._appendDescendants(includeChildrenElsewhere, lst)
+        return lst
+
+    def getParent(self) -> Entity | None:
+        if self.__classKind == "chapter":
+            return None
+        return super().getParent()
+
+    def getAncestors(self) -> list[Entity]:
+        lst: list[Entity] = []
+        self._appendAncestors(lst)
+        return lst
+
+    def _setChildren(self, children: list[Entity]) -> None:
+        self.__children = tuple(children)
+
+    def _appendDescendants(self, includeChildrenElsewhere: bool, lst: list[Entity]) -> None:
+        if includeChildrenElsewhere:
+            super()._appendDescendants(True, lst)
+            return
+        for child in self.__children:
+            lst.append(child)
+            child._appendDescendants(False, lst)
+
+    def _appendAncestors(self, lst: list[Entity]) -> None:
+        parent = self.getParent()
+        if parent is not None:
+            lst.append(parent)
+            parent._appendAncestors(lst)
+
+
 # Concrete class containing all the data (that we are interested in) of single ICD-11 MMS entities
 # String values for fields missing from this entity are empty strings, not None values
+# Lists are stored as tuples, so that they don't waste space for future growth and all the empty ones are the same object; the getters return new lists
+# Ids, codes and class kinds are interned, since the same strings are repeated in many entities and proxies
 class RealEntity(Entity):
+    __slots__ = (
+        "__id",
+        "__uri",
+        "__code",
+        "__title",
+        "__definition",
+        "__longDefinition",
+        "__fullySpecifiedName",
+        "__diagnosticCriteria",
+        "__codingNote",
+        "__blockId",
+        "__codeRange",
+        "__classKind",
+        "__children",
+        "__childrenElsewhere",
+        "__parent",
+        "__indexTerm",
+        "__inclusion",
+        "__exclusion",
+        "__relatedEntitiesInMaternalChapter",
+        "__relatedEntitiesInPerinatalChapter",
+        "__postcoordinationScale",
+        "__browserUrl",
+        "__ancestors",
+        "__inheritedCodingNote",
+        "__inheritedExclusion",
+    )
+
     def __init__(
         self,
         id: str,
@@ -547,9 +1446,9 @@ class RealEntity(Entity):
         postcoordinationScale: list[PostcoordinationAxis],
         browserUrl: str,
     ) -> None:
-        self.__id = id
+        self.__id = sys.intern(id)
         self.__uri = uri
-        self.__code = code
+        self.__code = sys.intern(code)
         self.__title = title
         self.__definition = definition
         self.__longDefinition = longDefinition
@@ -558,17 +1457,21 @@ class RealEntity(Entity):
         self.__codingNote = codingNote
         self.__blockId = blockId
         self.__codeRange = codeRange
-        self.__classKind = classKind
-        self.__children = children
-        self.__childrenElsewhere = childrenElsewhere
+        self.__classKind = sys.intern(classKind)
+        self.__children = tuple(children)
+        self.__childrenElsewhere = tuple(childrenElsewhere)
         self.__parent = parent
-        self.__indexTerm = indexTerm
-        self.__inclusion = inclusion
-        self.__exclusion = exclusion
-        self.__relatedEntitiesInMaternalChapter = relatedEntitiesInMaternalChapter
-        self.__relatedEntitiesInPerinatalChapter = relatedEntitiesInPerinatalChapter
-        self.__postcoordinationScale = postcoordinationScale
+        self.__indexTerm = tuple(indexTerm)
+        self.__inclusion = tuple(inclusion)
+        self.__exclusion = tuple(exclusion)
+        self.__relatedEntitiesInMaternalChapter = tuple(relatedEntitiesInMaternalChapter)
+        self.__relatedEntitiesInPerinatalChapter = tuple(relatedEntitiesInPerinatalChapter)
+        self.__postcoordinationScale = tuple(postcoordinationScale)
         self.__browserUrl = browserUrl
+        # values that depend on the ancestors are computed the first time they are needed and then kept, since entities never change
+        self.__ancestors: tuple[Entity, ...] | None = None
+        self.__inheritedCodingNote: str | None = None
+        self.__inheritedExclusion: tuple[Entity, ...] | None = None
 
     def getId(self) -> str:
         return self.__id
@@ -594,12 +1497,14 @@ class RealEntity(Entity):
     def getDiagnosticCriteria(self) -> str:
         return self.__diagnosticCriteria
 
-    def getCodingNote(self, includeFromUpperLevels: bool = False) -> str: #implementation could be made more efficient
+    def getCodingNote(self, includeFromUpperLevels: bool = False) -> str:
         if includeFromUpperLevels and self.__parent is not None:
-            if self.__codingNote == "": #avoids merging with empty strings
-                return self.__parent.getCodingNote(includeFromUpperLevels=True)
-            else:
-                return self.__parent.getCodingNote(includeFromUpperLevels=True) + "\n" + self.__codingNote
+            if self.__inheritedCodingNote is None:
+                if self.__codingNote == "": #avoids merging with empty strings
+                    self.__inheritedCodingNote = self.__parent.getCodingNote(includeFromUpperLevels=True)
+                else:
+                    self.__inheritedCodingNote = self.__parent.getCodingNote(includeFromUpperLevels=True) + "\n" + self.__codingNote
+            return self.__inheritedCodingNote
         else:
             return self.__codingNote
 
@@ -617,12 +1522,12 @@ class RealEntity(Entity):
 
     def getChildren(self, includeChildrenElsewhere: bool = False) -> list[Entity]:
         if includeChildrenElsewhere:
-            return self.__children + self.__childrenElsewhere
+            return list(self.__children + self.__childrenElsewhere)
         else:
-            return self.__children.copy()
+            return list(self.__children)
 
     def getChildrenElsewhere(self) -> list[Entity]:
-        return self.__childrenElsewhere.copy()
+        return list(self.__childrenElsewhere)
 
     def getDescendants(self, includeChildrenElsewhere: bool = False) -> list[Entity]:
         lst: list[Entity] = []
@@ -633,30 +1538,27 @@ class RealEntity(Entity):
         return self.__parent
 
     def getAncestors(self) -> list[Entity]:
-        lst: list[Entity] = []
-        self._appendAncestors(lst)
-        return lst
+        return list(self.__getAncestors())
 
     def getIndexTerm(self) -> list[str]:
-        return self.__indexTerm.copy()
+        return list(self.__indexTerm)
 
     def getInclusion(self) -> list[str]:
-        return self.__inclusion.copy()
+        return list(self.__inclusion)
 
     def getExclusion(self, includeFromUpperLevels: bool = True) -> list[Entity]:
-        lst: list[Entity] = self.__exclusion.copy()
-        if includeFromUpperLevels and self.__parent is not None:
-            self.__parent._appendExclusion(lst)
-        return lst
+        if includeFromUpperLevels:
+            return list(self.__getInheritedExclusion())
+        return list(self.__exclusion)
 
     def getRelatedEntitiesInMaternalChapter(self) -> list[Entity]:
-        return self.__relatedEntitiesInMaternalChapter.copy()
+        return list(self.__relatedEntitiesInMaternalChapter)
 
     def getRelatedEntitiesInPerinatalChapter(self) -> list[Entity]:
-        return self.__relatedEntitiesInPerinatalChapter.copy()
+        return list(self.__relatedEntitiesInPerinatalChapter)
 
     def getPostcoordinationScale(self) -> list[PostcoordinationAxis]:
-        return self.__postcoordinationScale.copy()
+        return list(self.__postcoordinationScale)
 
     def getBrowserUrl(self) -> str:
         return self.__browserUrl
@@ -672,15 +1574,139 @@ class RealEntity(Entity):
             child._appendDescendants(True, lst)
 
     def _appendAncestors(self, lst: list[Entity]) -> None:
-        if self.__parent is not None:
-            lst.append(self.__parent)
-            self.__parent._appendAncestors(lst)
+        lst.extend(self.__getAncestors())
 
     def _appendExclusion(self, lst: list[Entity]) -> None:
-        for ex in self.__exclusion:
-            lst.append(ex)
-        if self.__parent is not None:
-            self.__parent._appendExclusion(lst)
+        lst.extend(self.__getInheritedExclusion())
+
+    def __getAncestors(self) -> tuple[Entity, ...]:
+        if self.__ancestors is None:
+            if self.__parent is None:
+                self.__ancestors = ()
+            else:
+                lst: list[Entity] = []
+                self.__parent._appendAncestors(lst) # resolves the parent, so that if it was a proxy it's replaced in self.__parent before being stored
+                self.__ancestors = (self.__parent,) + tuple(lst)
+        return self.__ancestors
+
+    def __getInheritedExclusion(self) -> tuple[Entity, ...]:
+        # proxies inherited from an ancestor are replaced only in the ancestor, so the tuple is computed again if one of them was resolved
+        if self.__inheritedExclusion is not None and any(isinstance(e, ProxyEntity) and e._isResolved() for e in self.__inheritedExclusion):
+            self.__inheritedExclusion = None
+        if self.__inheritedExclusion is None:
+            lst: list[Entity] = list(self.__exclusion)
+            if self.__parent is not None:
+                self.__parent._appendExclusion(lst)
+            self.__inheritedExclusion = tuple(lst)
+        return self.__inheritedExclusion
+
+    # Replaces the given proxy with its RealEntity in all the fields of this entity
+    def _replaceProxy(self, proxy: ProxyEntity, real: Entity) -> None:
+        if self.__parent is proxy:
+            self.__parent = real
+        self.__children = _replaceInTuple(self.__children, proxy, real)
+        self.__childrenElsewhere = _replaceInTuple(self.__childrenElsewhere, proxy, real)
+        self.__exclusion = _replaceInTuple(self.__exclusion, proxy, real)
+        if self.__inheritedExclusion is not None and proxy in self.__inheritedExclusion:
+            self.__inheritedExclusion = None # will be computed again without the proxy
+        self.__relatedEntitiesInMaternalChapter = _replaceInTuple(self.__relatedEntitiesInMaternalChapter, proxy, real)
+        self.__relatedEntitiesInPerinatalChapter = _replaceInTuple(self.__relatedEntitiesInPerinatalChapter, proxy, real)
+        for axis in self.__postcoordinationScale:
+            axis._replaceProxy(proxy, real)
+
+
+
+# Index of a forest of entities, identified by their ids, that answers in constant time whether an entity descends from another, their lowest common ancestor and the depth of an entity
+# Each entity gets its number in a depth-first (pre-order) visit and the number of the last entity of its subtree, so that its descendants are the entities numbered in between (nested sets)
+# The lowest common ancestor of two entities is the entity with the lowest number visited between them in the Euler tour of the forest, found with a sparse table of minimums
+# The number of the parent of each entity is stored too, so that all the entities can be rolled up to their ancestors at a given depth in a single pass
+class _HierarchyIndex:
+    __slots__ = ("__numbers", "__ids", "__ends", "__depths", "__parents", "__firsts", "__minimums", "__rollUps")
+
+    # roots are the ids of the roots of the trees, with depth 0; getChildIds returns the ids of the children of an entity
+    def __init__(self, roots: list[str], getChildIds: Callable[[str], list[str]]) -> None:
+        self.__numbers: Dict[str, int] = {}
+        self.__ids: list[str] = []
+        self.__ends = array("i")
+        self.__depths = array("i")
+        self.__parents = array("i") # -1 for the roots
+        self.__firsts = array("i") # for each entity, its first position in the Euler tour
+        tour = array("i", [-1]) # the trees are joined by a virtual root numbered -1, so that entities in different trees have no common ancestor
+        for root in roots:
+            if root in self.__numbers:
+                continue
+            stack: list[tuple[int, Iterator[str]]] = [(self.__add(root, -1, tour), iter(getChildIds(root)))]
+            while len(stack) > 0:
+                number, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    self.__ends[number] = len(self.__ids) - 1
+                    tour.append(stack[-1][0] if len(stack) > 0 else -1)
+                elif child not in self.__numbers:
+                    stack.append((self.__add(child, number, tour), iter(getChildIds(child))))
+        # __minimums[k][i] is the lowest number in the 2**k positions of the tour starting from i
+        self.__minimums = [tour]
+        while 2 ** len(self.__minimums) <= len(tour):
+            previous = self.__minimums[-1]
+            half = 2 ** (len(self.__minimums) - 1)
+            self.__minimums.append(array("i", map(min, previous[:len(previous) - half], previous[half:])))
+        self.__rollUps: Dict[int, array] = {}
+
+    def __add(self, id: str, parent: int, tour: array) -> int:
+        number = len(self.__ids)
+        self.__numbers[id] = number
+        self.__ids.append(id)
+        self.__ends.append(number)
+        self.__depths.append(self.__depths[parent] + 1 if parent >= 0 else 0)
+        self.__parents.append(parent)
+        self.__firsts.append(len(tour))
+        tour.append(number)
+        return number
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def contains(self, id: str) -> bool:
+        return id in self.__numbers
+
+    # Returns true if the entity with id id is a descendant of the one with ancestorId; id must be in the index
+    def isDescendant(self, id: str, ancestorId: str) -> bool:
+        ancestor = self.__numbers.get(ancestorId)
+        return ancestor is not None and ancestor < self.__numbers[id] <= self.__ends[ancestor]
+
+    # Returns the id of the lowest common ancestor (or self) of the entities with ids a and b, or None if they are in different trees; both must be in the index
+    def getLowestCommonAncestor(self, a: str, b: str) -> str | None:
+        start, end = sorted((self.__firsts[self.__numbers[a]], self.__firsts[self.__numbers[b]]))
+        k = (end - start + 1).bit_length() - 1
+        number = min(self.__minimums[k][start], self.__minimums[k][end - 2 ** k + 1])
+        return self.__ids[number] if number >= 0 else None
+
+    # Returns the depth of the entity with id id, which must be in the index
+    def getDepth(self, id: str) -> int:
+        return self.__depths[self.__numbers[id]]
+
+    # Returns the number of the entity with id id, or -1 if it's not in the index
+    def getNumber(self, id: str) -> int:
+        return self.__numbers.get(id, -1)
+
+    def getId(self, number: int) -> str:
+        return self.__ids[number]
+
+    def getDepthOfNumber(self, number: int) -> int:
+        return self.__depths[number]
+
+    # Returns, for each number, the number of the ancestor of that entity with the given depth, or the number itself if the entity is not deeper than that
+    # Parents are numbered before their children, so a single pass in order of number is enough; the result is kept for the following calls
+    def getRollUp(self, depth: int) -> array:
+        rollUp = self.__rollUps.get(depth)
+        if rollUp is None:
+            rollUp = array("i", range(len(self.__ids)))
+            for number, parent in enumerate(self.__parents):
+                if self.__depths[number] > depth:
+                    rollUp[number] = rollUp[parent]
+            self.__rollUps[depth] = rollUp
+        return rollUp
 
 
 
@@ -695,54 +1721,65 @@ class ICDExplorer:
         release: str | None = None,
         customUrl: str | None = None,
         useCodeRangesAsCodes: bool = False,
+        cacheFile: str | None = None,
+        cacheMaxEntries: int | None = None,
+        snapshotFile: str | None = None,
+        negativeCacheMaxEntries: int = 10000,
+        requestsPerSecond: float | None = None,
+        maxRetries: int = 3,
+        lazy: bool = False,
+        latestReleaseTtl: float = 3600,
+        tokenFile: str | None = None,
     ) -> None:
-        if customUrl is None: #creates correct API client
-            self.__clientAPI = ICDOfficialAPIClient(clientId,clientSecret)
+        self.__metrics = _Metrics()
+        if snapshotFile is not None: #creates correct API client
+            self.__clientAPI: ICDAPIClient = ICDSnapshotClient(snapshotFile)
+            latestReleaseTtl = 0 # the release is always the one of the snapshot, never one found by the explorers using the API it was created from
+        elif customUrl is None:
+            createClient: Callable[[], ICDAPIClient] = lambda: ICDOfficialAPIClient(clientId,clientSecret,requestsPerSecond=requestsPerSecond,maxRetries=maxRetries,tokenFile=tokenFile)
+            self.__clientAPI = _LazyAPIClient(createClient, ICDOfficialAPIClient.LOCATION_URL) if lazy else createClient()
         else:
-            self.__clientAPI = ICDOtherAPIClient(customUrl)
-
-        if release is None: #finds or sets release
-            self.__release = self.__clientAPI.getLatestRelease(language)
-        else:
-            if self.__clientAPI.checkRelease(release, language):
-                self.__release = release
-            else:
-                raise LookupError("Release \""+release+"\" was not found for language \""+language+"\"")
-
+            createClient = lambda: ICDOtherAPIClient(customUrl,requestsPerSecond=requestsPerSecond,maxRetries=maxRetries)
+            self.__clientAPI = _LazyAPIClient(createClient, ICDOtherAPIClient._getLocationUrl(customUrl)) if lazy else createClient()
+        self.__clientAPI = _InstrumentedAPIClient(self.__clientAPI, self.__metrics) # below the cache, so that only the requests that reach the API are measured
+        if cacheFile is not None: #adds the persistent cache
+            self.__clientAPI = ICDCachedAPIClient(self.__clientAPI, cacheFile, cacheMaxEntries, latestReleaseTtl)
+
+        self.__requestedRelease = release
+        self.__latestReleaseTtl = latestReleaseTtl
+        self.__release: str | None = None # found or checked by getRelease()
         self.__language = language
         self.__useCodeRangesAsCodes = useCodeRangesAsCodes
         self.__idMap = {}
         self.__codeToIdMap = {}
+        self.__proxyHolders: Dict[str, list[RealEntity]] = {} # for each id of a ProxyEntity in __idMap, the entities that contain it
+        self.__blockRanges: Dict[str, tuple[str, str]] = {} # for each block that was created, the first and last code of its code range
+        self.__rangeIndex: tuple[list[str], list[str], list[str], list[int]] | None = None # built from __blockRanges when needed, see __getRangeIndex()
+        self.__allBlocksLoaded = False
+        self.__hierarchyVersion = 0 # incremented for each entity added to the part of the hierarchy in the index, so that __getHierarchyIndex() knows when to rebuild it
+        self.__hierarchyIndex: tuple[int, _HierarchyIndex] | None = None # built when needed, with the value of __hierarchyVersion at that time
+        self.__allCodesLoaded = False # true after a SimpleTabulation file is loaded, since it lists all the codes
+        self.__notFound: OrderedDict[tuple[str, str], str] = OrderedDict() # the codes and ids known not to exist, as ("code", code) or ("id", id), with the message of their LookupError
+        self.__notFoundMaxEntries = negativeCacheMaxEntries
+        self.__notFoundHits = 0
+        self.__notFoundMisses = 0
+        self.__lock = threading.RLock() # guards the maps, so that the explorer can be shared between threads
+        self.__inFlight: Dict[tuple[str, str], Future] = {} # the lookups in progress, see __singleFlight()
+        if not lazy:
+            self.getRelease()
 
     # Given a code, returns true if its a valid code for the parameters of this Explorer
     def isValidCode(self, code: str) -> bool:
-        if code in self.__codeToIdMap:
-            return True
-        if self.__useCodeRangesAsCodes and "-" in code: #code ranges as codes
-            if self.isValidCode(code.split("-")[0]):
-                e = self.getEntityFromCode(code.split("-")[0])
-                e = e.getParent()
-                while e is not None: # controls the ancestors until it find the code or it reaches a chapter
-                    if e.getCode() == code:
-                        return True
-                    e = e.getParent()
-                return False
-            else:
-                return False
         try:
-            dict = self.__clientAPI.lookupCode(code, self.__release, self.__language)
-            self.__createAndAddNewEntity(dict)
+            self.getEntityFromCode(code)
             return True
         except LookupError:
             return False
 
     # Given an id, returns true if its a valid id for the parameters of this Explorer
     def isValidId(self, id: str) -> bool:
-        if id in self.__idMap:
-            return True
         try:
-            dict = self.__clientAPI.lookupId(id, self.__release, self.__language)
-            self.__createAndAddNewEntity(dict)
+            self.getEntityFromId(id)
             return True
         except LookupError:
             return False
@@ -750,38 +1787,537 @@ class ICDExplorer:
     # Given a code, returns its corresponding entity
     # Raises LookupError if code is not a valid code for the parameters of this Explorer
     def getEntityFromCode(self, code: str) -> Entity:
-        if code in self.__codeToIdMap:
-            return self.__idMap[self.__codeToIdMap[code]]
+        e = self._getCachedEntityFromCode(code)
+        if e is not None:
+            return e
         if self.__useCodeRangesAsCodes and "-" in code: #code ranges as codes
-            if self.isValidCode(code.split("-")[0]):
+            if not self.__allBlocksLoaded and self.isValidCode(code.split("-")[0]): # if all blocks are loaded, all the existing code ranges are in __codeToIdMap
                 e = self.getEntityFromCode(code.split("-")[0])
                 e = e.getParent()
                 while e is not None: # controls the ancestors until it find the code or it reaches a chapter
                     if e.getCode() == code:
                         return e
                     e = e.getParent()
-            raise LookupError("Code range \""+code+"\" was not found for release \""+self.__release+"\" in language \""+self.__language+"\".")
-        dict = self.__clientAPI.lookupCode(code, self.__release, self.__language)
-        return self.__createAndAddNewEntity(dict)
+            raise LookupError("Code range \""+code+"\" was not found for release \""+self.getRelease()+"\" in language \""+self.__language+"\".")
+        return self.__singleFlight(("code", code), self.__lookUpEntityFromCode, code)
 
     # Given an id, returns its corresponding entity
     # Raises LookupError if id is not a valid id for the parameters of this Explorer
     def getEntityFromId(self, id: str) -> Entity:
-        if id in self.__idMap:
-            return self.__idMap[id]
-        dict = self.__clientAPI.lookupId(id, self.__release, self.__language)
-        return self.__createAndAddNewEntity(dict)
+        e = self._getCachedEntity(id)
+        if e is not None:
+            return e
+        error = self._getFromNegativeCache("id", id)
+        if error is not None:
+            raise error
+        try:
+            return self._getRealEntity(id)
+        except LookupError as e:
+            self._addToNegativeCache("id", id, e)
+            raise
+
+    # Given an iterable of codes, returns a list containing, for each code and in the same order, its corresponding entity
+    # If a code is not valid for the parameters of this Explorer, the LookupError is put in the list in place of the entity
+    # Duplicates are looked up only once, and the codes that are not already cached are looked up concurrently by up to maxWorkers threads:
+    # first they are all resolved into ids, then the entities of the distinct ids that are not loaded yet are looked up, so codes of the same entity don't fetch it twice
+    def getEntitiesFromCodes(self, codes: Iterable[str], maxWorkers: int = 10) -> list[Entity | LookupError]:
+        codes = list(codes)
+        results: Dict[str, Entity | LookupError] = {}
+        toLookUp = [c for c in dict.fromkeys(codes) if c not in self.__codeToIdMap and not (self.__useCodeRangesAsCodes and "-" in c)]
+        self.__metrics.count("explorer.codeMap.misses", len(toLookUp))
+        codeIds = dict(zip(toLookUp, self.__lookUpConcurrently(self.__lookUpCodeId, toLookUp, maxWorkers)))
+        ids = list(dict.fromkeys(id for id in codeIds.values() if isinstance(id, str)))
+        entities = dict(zip(ids, self.getEntitiesFromIds(ids, maxWorkers)))
+        results.update((code, entities[id] if isinstance(id, str) else id) for code, id in codeIds.items())
+        for code in codes: # cached codes and code ranges
+            if code not in results:
+                try:
+                    results[code] = self.getEntityFromCode(code)
+                except LookupError as e:
+                    results[code] = e
+        return [results[c] for c in codes]
+
+    # Given an iterable of ids, returns a list containing, for each id and in the same order, its corresponding entity
+    # If an id is not valid for the parameters of this Explorer, the LookupError is put in the list in place of the entity
+    # Duplicates are looked up only once, and the ids that are not already loaded (including those known only through a proxy) are looked up concurrently by up to maxWorkers threads
+    def getEntitiesFromIds(self, ids: Iterable[str], maxWorkers: int = 10) -> list[Entity | LookupError]:
+        ids = list(ids)
+        results: Dict[str, Entity | LookupError] = {}
+        toLookUp = [i for i in dict.fromkeys(ids) if not isinstance(self.__idMap.get(i), RealEntity)]
+        results.update(zip(toLookUp, self.__lookUpConcurrently(self.__getLoadedEntityFromId, toLookUp, maxWorkers)))
+        return [results[i] if i in results else self.getEntityFromId(i) for i in ids]
+
+    # Like getEntityFromId(), but the entities that were only created as proxies are looked up too, so that their data is loaded
+    def __getLoadedEntityFromId(self, id: str) -> Entity:
+        if id not in self.__idMap:
+            return self.getEntityFromId(id)
+        self.__metrics.count("explorer.idMap.hits")
+        return self._getRealEntity(id)
+
+    # Looks up the descendants of entity up to depth levels below it (all of them if depth is None), so that the following traversals of the subtree don't need the API
+    # The entities are looked up concurrently by up to maxWorkers threads: when the whole subtree is needed, its ids are listed by the API with a single request,
+    # otherwise (or if the API can't list them) the subtree is looked up one level at a time
+    def prefetch(self, entity: Entity, depth: int | None = None, includeChildrenElsewhere: bool = False, maxWorkers: int = 10) -> None:
+        if depth is None and not includeChildrenElsewhere: # the descendants listed by the API don't include the children elsewhere
+            ids = self.__clientAPI.lookupRelatedIds(entity.getId(), self.getRelease(), self.__language, "descendant")
+            if ids is not None: # the list contains the whole subtree, so there's no need to visit it
+                self.__resolveConcurrently([entity.getId()] + ids, maxWorkers)
+                return
+        frontier = [entity.getId()]
+        visited = set(frontier)
+        level = 0
+        while len(frontier) > 0:
+            self.__resolveConcurrently(frontier, maxWorkers)
+            if depth is not None and level >= depth:
+                return
+            nextFrontier: list[str] = []
+            for id in frontier:
+                for c in self.__idMap[id].getChildren(includeChildrenElsewhere=includeChildrenElsewhere):
+                    if c.getId() not in visited:
+                        visited.add(c.getId())
+                        nextFrontier.append(c.getId())
+            frontier = nextFrontier
+            level += 1
+
+    # Looks up all the ancestors of entity, so that entity.getAncestors() and the methods that inherit data from the ancestors don't need the API
+    # The ids of the ancestors of the first one that is not loaded are listed by the API with a single request, sent while that ancestor is looked up,
+    # and they are looked up concurrently by up to maxWorkers threads; if the API can't list them, they are looked up one at a time
+    def prefetchAncestors(self, entity: Entity, maxWorkers: int = 10) -> None:
+        id = entity.getId()
+        current = self.__idMap.get(id)
+        while isinstance(current, RealEntity): # the ancestors that are already loaded need no request
+            parent = current.getParent()
+            if parent is None:
+                return
+            id = parent.getId()
+            current = self.__idMap.get(id)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            listing = executor.submit(self.__clientAPI.lookupRelatedIds, id, self.getRelease(), self.__language, "ancestor")
+            self._getRealEntity(id)
+            ids = listing.result()
+        if ids is not None:
+            self.__resolveConcurrently(ids, maxWorkers)
+        entity.getAncestors()
+
+    # Reads a SimpleTabulation file (published by the WHO for each release) and creates the entities it lists, without contacting the API
+    # Their codes, titles, class kinds, block ids, parents and children are known immediately, the rest of their data is looked up when first needed
+    # After that, codes that are not in the file are known not to exist; the file must be of the release and language of this Explorer
+    # Returns the number of entities read from the file
+    def loadSimpleTabulation(self, path: str) -> int:
+        rows = _readSimpleTabulation(path)
+        with self.__lock:
+            ancestors: list[Entity] = [] # the entities read before the current one that can be its ancestors, one for each depth
+            children: Dict[str, list[Entity]] = {}
+            for id, uri, code, title, classKind, blockId, depth in rows:
+                del ancestors[depth:]
+                parent = ancestors[-1] if len(ancestors) > 0 else None
+                e = self.__idMap.get(id)
+                if not isinstance(e, (RealEntity, TabulationEntity)): # the entities whose children are already known are kept, since other entities may contain them
+                    old = e
+                    e = TabulationEntity(self, id, uri, None if self.__useCodeRangesAsCodes and classKind == "block" else code, title, classKind, blockId, parent)
+                    self.__idMap[id] = e
+                    children[id] = []
+                    if old is not None: # a proxy is replaced like when it's resolved, and the entities that contained it now contain the new proxy
+                        holders = self.__proxyHolders.pop(id, [])
+                        for holder in holders:
+                            holder._replaceProxy(old, e) # type: ignore
+                        self.__proxyHolders[id] = holders
+                if parent is not None and parent.getId() in children:
+                    children[parent.getId()].append(e)
+                if code != "" and code not in self.__codeToIdMap:
+                    self.__codeToIdMap[code] = id
+                ancestors.append(e)
+            for id, lst in children.items():
+                self.__idMap[id]._setChildren(lst) # type: ignore
+            self.__hierarchyVersion += len(children)
+            self.__allCodesLoaded = True
+        return len(rows)
 
     def getLanguage(self) -> str:
         return self.__language
 
+    # Returns the release used by this Explorer, finding or checking it first if the explorer is lazy and it wasn't needed yet
+    # Raises LookupError if the requested release was not found
     def getRelease(self) -> str:
+        if self.__release is None:
+            with self.__lock:
+                if self.__release is None:
+                    self.__release = self.__findRelease()
         return self.__release
 
+    def __findRelease(self) -> str:
+        if self.__requestedRelease is None:
+            return _getLatestRelease(self.__clientAPI, self.__language, self.__latestReleaseTtl)
+        if self.__clientAPI.checkRelease(self.__requestedRelease, self.__language):
+            return self.__requestedRelease
+        raise LookupError("Release \""+self.__requestedRelease+"\" was not found for language \""+self.__language+"\"")
+
+    # Looks up all the chapters and blocks, so that code ranges can be checked and searched without the API
+    # The children of chapters and blocks are looked up too, since their class kind is unknown until then; each level is looked up concurrently by up to maxWorkers threads
+    def loadBlocks(self, maxWorkers: int = 10) -> None:
+        if self.__allBlocksLoaded:
+            return
+        frontier: list[Entity] = [self._addEntity(data) for data in _lookUpChapters(self.__clientAPI, self.getRelease(), self.__language)]
+        while len(frontier) > 0:
+            children = [c.getId() for e in frontier for c in e.getChildren()]
+            self.__resolveConcurrently(children, maxWorkers)
+            frontier = [self.__idMap[id] for id in children if self.__idMap[id].getClassKind() == "block"]
+        self.__allBlocksLoaded = True
+
+    # Given a code, returns the blocks whose code range contains it, from the smallest to the largest
+    # The first time it's called, it loads all the blocks with loadBlocks()
+    def getBlocksContainingCode(self, code: str) -> list[Entity]:
+        self.loadBlocks()
+        starts, ends, ids, enclosing = self.__getRangeIndex()
+        stem = code.split(".")[0].split("&")[0].split("/")[0] # subcategories and postcoordination are in the range of their stem code
+        i = bisect_right(starts, stem) - 1 # the block with the last start not greater than stem: all the blocks containing stem are it or enclose it
+        blocks: list[Entity] = []
+        while i >= 0:
+            if stem <= ends[i]:
+                blocks.append(self.__idMap[ids[i]])
+            i = enclosing[i]
+        return blocks
+
+    # Returns true if entity is a descendant of ancestor, that is if ancestor is among the entities returned by entity.getAncestors()
+    # If entity was loaded together with its ancestors up to the chapter (for example with prefetch() or loadSimpleTabulation()), this takes constant time and needs no request
+    def isDescendantOf(self, entity: Entity, ancestor: Entity) -> bool:
+        index = self.__getHierarchyIndex([entity.getId()])
+        if index.contains(entity.getId()): # all its ancestors are in the index too
+            return index.isDescendant(entity.getId(), ancestor.getId())
+        return ancestor.getId() in [e.getId() for e in entity.getAncestors()]
+
+    # Returns the deepest entity that is an ancestor of both a and b, or one of them if it's an ancestor of the other; returns None if they are in different chapters
+    # If both were loaded together with their ancestors up to the chapter, this takes constant time and needs no request
+    def getLowestCommonAncestor(self, a: Entity, b: Entity) -> Entity | None:
+        index = self.__getHierarchyIndex([a.getId(), b.getId()])
+        if index.contains(a.getId()) and index.contains(b.getId()):
+            id = index.getLowestCommonAncestor(a.getId(), b.getId())
+            return self.__idMap[id] if id is not None else None
+        ancestorsOfA = {e.getId() for e in [a] + a.getAncestors()}
+        for e in [b] + b.getAncestors():
+            if e.getId() in ancestorsOfA:
+                return e
+        return None
+
+    # Returns the number of ancestors of entity, so 0 for chapters
+    # If entity was loaded together with its ancestors up to the chapter, this takes constant time and needs no request
+    def getDepth(self, entity: Entity) -> int:
+        index = self.__getHierarchyIndex([entity.getId()])
+        if index.contains(entity.getId()):
+            return index.getDepth(entity.getId())
+        return len(entity.getAncestors())
+
+    # Given many codes, for example a NumPy array or a pandas Series, returns for each of them the code ("code"), the id ("id") of its ancestor at the given depth, or its own depth ("depth")
+    # The ancestor at depth 0 is the chapter, at depth 1 the block or category directly inside the chapter, and so on; the entities that are not deeper than depth are returned themselves
+    # Postcoordinated codes are rolled up like their stem code; blocks have an empty code, unless code ranges are used as codes and the block was looked up in the API
+    # Returns the results and a list of booleans that is False for the unknown codes, whose result is "" (or -1 for "depth"); if the codes are a NumPy array (or another object that can be converted to one)
+    # and NumPy was already imported by the caller, both are NumPy arrays, otherwise they are lists
+    # Only the codes of entities loaded together with their ancestors (as after loadSimpleTabulation() or prefetch() on the chapters) are known: this method never contacts the API
+    # Each distinct code is looked up only once, so it's fast even for millions of codes; other values, such as missing values, are unknown codes
+    def rollUpCodes(self, codes: Iterable[str], depth: int = 0, result: str = "code") -> tuple[Any, Any]:
+        if result not in ("code", "id", "depth"):
+            raise ValueError("The result must be \"code\", \"id\" or \"depth\", not \""+result+"\"")
+        if depth < 0:
+            raise ValueError("The depth can't be negative")
+        index = self.__getHierarchyIndex()
+        rollUp = index.getRollUp(depth)
+        empty: Any = -1 if result == "depth" else ""
+
+        def rollUpCode(code: Any) -> tuple[Any, bool]:
+            if not isinstance(code, str): # for example, missing values in a pandas Series
+                return empty, False
+            with self.__lock:
+                number = index.getNumber(self.__codeToIdMap.get(code.split("&")[0].split("/")[0], ""))
+            if number < 0:
+                return empty, False
+            if result == "depth":
+                return index.getDepthOfNumber(number), True
+            id = index.getId(rollUp[number])
+            return (id if result == "id" else self.__getLoadedCode(self.__idMap[id])), True
+
+        numpy = sys.modules.get("numpy") # not imported here, since it's only needed if the codes are already in an array
+        if numpy is not None and hasattr(codes, "__array__"):
+            values = numpy.asarray(codes)
+            positions: Dict[Any, int] = {} # the position of each distinct code in rolledUp
+            inverse = array("i")
+            for code in values.ravel().tolist():
+                position = positions.get(code)
+                if position is None:
+                    position = positions[code] = len(positions)
+                inverse.append(position)
+            rolledUp = [rollUpCode(code) for code in positions]
+            take = numpy.frombuffer(inverse, dtype=numpy.intc)
+            results = numpy.array([r[0] for r in rolledUp], dtype=numpy.int32 if result == "depth" else str)
+            known = numpy.array([r[1] for r in rolledUp], dtype=bool)
+            return results[take].reshape(values.shape), known[take].reshape(values.shape)
+        memo: Dict[Any, tuple[Any, bool]] = {}
+        resultList: list[Any] = []
+        knownList: list[bool] = []
+        for code in codes:
+            r = memo.get(code)
+            if r is None:
+                r = memo[code] = rollUpCode(code)
+            resultList.append(r[0])
+            knownList.append(r[1])
+        return resultList, knownList
+
+    # Returns the entities loaded by this Explorer and their hierarchy as a LinearizationArrays, where they are identified by their position in depth-first order
+    # The entities are those that can be reached from the loaded chapters through loaded entities: children that were not looked up yet are left out,
+    # so the whole classification should be loaded first, for example with loadSimpleTabulation()
+    # Children elsewhere are only known for entities looked up in the API, and are included if they were loaded
+    def exportArrays(self) -> LinearizationArrays:
+        with self.__lock: # only the visit needs the lock, the entities it collects are then read without it
+            loaded = (RealEntity, TabulationEntity)
+            chapters = sorted((e for e in self.__idMap.values() if isinstance(e, loaded) and e.getClassKind() == "chapter"), key=self.__getLoadedCode)
+            entities: list[Entity] = []
+            numbers: Dict[str, int] = {}
+            parents = array("i")
+            stack: list[tuple[Entity, int]] = [(c, -1) for c in reversed(chapters)]
+            while len(stack) > 0:
+                e, parent = stack.pop()
+                if e.getId() in numbers:
+                    continue
+                numbers[e.getId()] = len(entities)
+                entities.append(e)
+                parents.append(parent)
+                children = [self.__idMap[c.getId()] for c in e.getChildren()] # the entities in __idMap, since the children may still be the proxies they replaced
+                stack.extend((c, numbers[e.getId()]) for c in reversed(children) if isinstance(c, loaded))
+        childOffsets, childIndices = array("i", [0]), array("i")
+        elsewhereOffsets, elsewhereIndices = array("i", [0]), array("i")
+        classKindNames: Dict[str, int] = {}
+        classKinds = array("b")
+        strings: Dict[str, int] = {}
+        codes, titles = array("i"), array("i")
+        for e in entities:
+            childIndices.extend(numbers[c.getId()] for c in e.getChildren() if c.getId() in numbers)
+            childOffsets.append(len(childIndices))
+            if isinstance(e, RealEntity):
+                elsewhereIndices.extend(numbers[c.getId()] for c in e.getChildrenElsewhere() if c.getId() in numbers)
+            elsewhereOffsets.append(len(elsewhereIndices))
+            classKinds.append(classKindNames.setdefault(e.getClassKind(), len(classKindNames)))
+            codes.append(strings.setdefault(self.__getLoadedCode(e), len(strings)))
+            titles.append(strings.setdefault(e.getTitle(), len(strings)))
+        return LinearizationArrays([e.getId() for e in entities], parents, childOffsets, childIndices, elsewhereOffsets, elsewhereIndices,
+                                   list(classKindNames), classKinds, list(strings), codes, titles)
+
+    # Returns the code of a loaded entity without contacting the API, so "" for blocks read from a SimpleTabulation file when code ranges are used as codes
+    def __getLoadedCode(self, e: Entity) -> str:
+        if isinstance(e, TabulationEntity):
+            return e._getKnownCode()
+        return e.getCode()
+
+    # Returns the index of the entities that can be reached from the loaded chapters through loaded entities, building it again if entities were added to it since it was built
+    # Entities that were not loaded yet (proxies) are in the index if their parent is, but their children are not
+    # An index that is out of date is still right about the entities it contains, so if ids are given it's built again only if one of them is missing but would be in the new index,
+    # and the entities added since it was built are at least an eighth of those in it; otherwise the caller uses getAncestors(), which needs no request for those entities
+    def __getHierarchyIndex(self, ids: list[str] | None = None) -> _HierarchyIndex:
+        with self.__lock:
+            index = self.__hierarchyIndex
+            if index is None or (index[0] != self.__hierarchyVersion and (ids is None or ((self.__hierarchyVersion - index[0]) * 8 >= len(index[1])
+                                                                                           and any(self.__isReachable(id, index[1]) for id in ids)))):
+                chapters = sorted(id for id, e in self.__idMap.items() if isinstance(e, (RealEntity, TabulationEntity)) and e.getClassKind() == "chapter")
+                self.__hierarchyIndex = (self.__hierarchyVersion, _HierarchyIndex(chapters, self.__getLoadedChildIds))
+            return self.__hierarchyIndex[1]
+
+    # Returns true if id is not in index, but would be in an index built now: its ancestors are loaded up to a chapter, or up to an entity in index
+    def __isReachable(self, id: str, index: _HierarchyIndex) -> bool:
+        if index.contains(id):
+            return False
+        e = self.__idMap.get(id)
+        while isinstance(e, (RealEntity, TabulationEntity)):
+            parent = e.getParent()
+            if parent is None:
+                return True
+            e = self.__idMap.get(parent.getId())
+            if isinstance(e, (RealEntity, TabulationEntity)) and index.contains(parent.getId()):
+                return True
+        return False
+
+    def __getLoadedChildIds(self, id: str) -> list[str]:
+        e = self.__idMap[id]
+        if isinstance(e, (RealEntity, TabulationEntity)):
+            return [c.getId() for c in e.getChildren()]
+        return []
+
+    # Returns the index of the code ranges of the blocks in __blockRanges, building it again if new blocks were created
+    # The index contains the starts, ends and ids of the ranges sorted by start (and, for equal starts, from the largest to the smallest)
+    # and, for each range, the position of the smallest range that encloses it, or -1; blocks in ICD-11 are either nested or disjoint
+    def __getRangeIndex(self) -> tuple[list[str], list[str], list[str], list[int]]:
+        with self.__lock: # blocks may be added by other threads while the index is built
+            if self.__rangeIndex is None or len(self.__rangeIndex[0]) != len(self.__blockRanges):
+                entries = sorted(self.__blockRanges.items(), key=lambda item: item[1][1], reverse=True)
+                entries.sort(key=lambda item: item[1][0]) # stable, so larger ranges come first when starts are equal
+                enclosing: list[int] = []
+                stack: list[int] = [] # the ranges that contain the start of the current one
+                for i, (_, (start, end)) in enumerate(entries):
+                    while len(stack) > 0 and entries[stack[-1]][1][1] < start:
+                        stack.pop()
+                    enclosing.append(stack[-1] if len(stack) > 0 else -1)
+                    stack.append(i)
+                self.__rangeIndex = ([e[1][0] for e in entries], [e[1][1] for e in entries], [e[0] for e in entries], enclosing)
+            return self.__rangeIndex
+
+    # Downloads all the entities of the release and language of this Explorer and stores them in a snapshot file at path
+    # The snapshot can then be used by other explorers through the snapshotFile parameter, without connecting to the API
+    def createSnapshot(self, path: str, maxWorkers: int = 10) -> None:
+        ICDSnapshotClient.createSnapshot(self.__clientAPI, path, self.getRelease(), self.__language, maxWorkers)
+
+    # Calls lookup (a method of this Explorer that returns an entity, or the id of an entity) on each key using up to maxWorkers threads, and yields the results in the same order as the keys
+    # A LookupError is yielded instead of the result for keys that do not exist, other errors are raised
+    def __lookUpConcurrently(self, lookup: Callable[[str], Any], keys: list[str], maxWorkers: int) -> Iterable[Any]:
+        def lookUpKey(key: str) -> Any:
+            try:
+                return lookup(key)
+            except LookupError as e:
+                return e
+        if len(keys) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            yield from executor.map(lookUpKey, keys)
+
+    # Looks up the entities with the given ids that are not loaded yet, using up to maxWorkers threads; raises the first LookupError, if any
+    def __resolveConcurrently(self, ids: list[str], maxWorkers: int) -> None:
+        toLookUp = [id for id in ids if not isinstance(self.__idMap.get(id), RealEntity)]
+        for e in self.__lookUpConcurrently(self._getRealEntity, toLookUp, maxWorkers):
+            if isinstance(e, LookupError):
+                raise e
+
+    # Returns a dict with the number of hits and misses of the negative cache, that is the lookups of codes and ids that were found or not found
+    # among those known not to exist, and the number of codes and ids that it currently contains
+    def getNegativeCacheInfo(self) -> dict[str, int]:
+        return {"hits": self.__notFoundHits, "misses": self.__notFoundMisses, "entries": len(self.__notFound), "maxEntries": self.__notFoundMaxEntries}
+
+    def __lookUpEntityFromCode(self, code: str) -> Entity:
+        if code in self.__codeToIdMap: # added by a lookup that ended after the check in getEntityFromCode()
+            return self.__idMap[self.__codeToIdMap[code]]
+        return self._getRealEntity(self.__lookUpCodeId(code))
+
+    # Returns the id of the entity with the given code, asking the API only if the code is not in __codeToIdMap
+    def __lookUpCodeId(self, code: str) -> str:
+        if code in self.__codeToIdMap:
+            return self.__codeToIdMap[code]
+        if self.__allCodesLoaded and "&" not in code and "/" not in code: # the file lists all the stem codes, but not their combinations
+            raise LookupError("No ICD-11 entity with code " + code + " was found for release " + self.getRelease() + " in language " + self.__language + ".")
+        return self.__lookUpWithNegativeCache("code", self.__clientAPI.lookupCodeId, code)
+
+    # Returns the metrics collected since the creation of this Explorer (or the last call to resetMetrics()), as a dict with two entries:
+    # "counters", with the number of calls to each method of the API client, of hits and misses of the maps and of resolved proxies,
+    # and "latencies", with a histogram of the time taken by each method of the API client and by the creation of the entities
+    def getMetrics(self) -> dict[str, Any]:
+        return self.__metrics.getMetrics()
+
+    def resetMetrics(self) -> None:
+        self.__metrics.reset()
+
+    # Adds a function that is called with each new measurement, as hook(kind, name, value), so that the metrics can be exported
+    # kind is "count" for counters (value is the increment) and "latency" for durations (value is in seconds)
+    def addMetricsHook(self, hook: Callable[[str, str, float], None]) -> None:
+        self.__metrics.addHook(hook)
+
+    # Calls lookup (lookupCodeId or lookupId of the API client) on key, unless key is known not to exist
+    # kind is "code" or "id"; if the lookup raises a LookupError, key is added to the negative cache
+    def __lookUpWithNegativeCache(self, kind: str, lookup: Callable[[str, str, str], Any], key: str) -> Any:
+        error = self._getFromNegativeCache(kind, key)
+        if error is not None:
+            raise error
+        try:
+            return lookup(key, self.getRelease(), self.__language)
+        except LookupError as e:
+            self._addToNegativeCache(kind, key, e)
+            raise
+
+    # Returns a new LookupError if the code or id (depending on kind) is known not to exist, otherwise None
+    def _getFromNegativeCache(self, kind: str, key: str) -> LookupError | None:
+        with self.__lock:
+            message = self.__notFound.get((kind, key))
+            if message is None:
+                self.__notFoundMisses += 1
+            else:
+                self.__notFoundHits += 1
+                self.__notFound.move_to_end((kind, key))
+        self.__metrics.count("explorer.negativeCache.misses" if message is None else "explorer.negativeCache.hits")
+        return LookupError(message) if message is not None else None
+
+    # Records that the code or id (depending on kind) does not exist, discarding the least recently used entry if the negative cache is full
+    def _addToNegativeCache(self, kind: str, key: str, error: LookupError) -> None:
+        if self.__notFoundMaxEntries <= 0:
+            return
+        with self.__lock:
+            self.__notFound[(kind, key)] = str(error)
+            self.__notFound.move_to_end((kind, key))
+            if len(self.__notFound) > self.__notFoundMaxEntries:
+                self.__notFound.popitem(last=False)
+
+    # Calls function(*args), unless a call with the same key is already in progress in another thread: in that case, waits for it and returns its result
+    # (or raises its exception), so that concurrent requests for the same code or id reach the API only once
+    def __singleFlight(self, key: tuple[str, str], function: Callable[..., Any], *args: Any) -> Any:
+        with self.__lock:
+            flight = self.__inFlight.get(key)
+            isOwner = flight is None
+            if flight is None:
+                flight = self.__inFlight[key] = Future()
+        if not isOwner:
+            return flight.result()
+        try:
+            result = function(*args)
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                del self.__inFlight[key]
+
     def _getRealEntity(self, id: str) -> Entity:
-        if id in self.__idMap and isinstance(self.__idMap[id], RealEntity):
-            return self.__idMap[id]
-        return self.__createAndAddNewEntity(self.__clientAPI.lookupId(id,self.__release,self.__language))
+        e = self.__idMap.get(id)
+        if isinstance(e, RealEntity):
+            return e
+        return self.__singleFlight(("id", id), self.__lookUpRealEntity, id)
+
+    def __lookUpRealEntity(self, id: str) -> Entity:
+        e = self.__idMap.get(id)
+        if isinstance(e, RealEntity): # created by a lookup that ended after the check in _getRealEntity()
+            return e
+        return self._addEntity(self.__clientAPI.lookupId(id, self.getRelease(), self.__language))
+
+    # Returns the entity with the given id if it was already created, otherwise None
+    # If countLookup is true, the result is counted as a hit or a miss of the map of the ids
+    def _getCachedEntity(self, id: str, countLookup: bool = True) -> Entity | None:
+        e = self.__idMap.get(id)
+        if countLookup:
+            self.__metrics.count("explorer.idMap.misses" if e is None else "explorer.idMap.hits")
+        return e
+
+    # Returns the entity with the given code if it was already created, otherwise None
+    # The result is counted as a hit or a miss of the map of the codes
+    def _getCachedEntityFromCode(self, code: str) -> Entity | None:
+        if code in self.__codeToIdMap:
+            self.__metrics.count("explorer.codeMap.hits")
+            return self.__idMap[self.__codeToIdMap[code]]
+        self.__metrics.count("explorer.codeMap.misses")
+        return None
+
+    # Returns the metrics collected by this Explorer, see getMetrics()
+    def _getMetrics(self) -> _Metrics:
+        return self.__metrics
+
+    # Creates the entity from data obtained from the API, unless its RealEntity was already created
+    def _addEntity(self, data: dict) -> Entity:
+        with self.__lock:
+            old = self.__idMap.get(data["@id"].split("/mms/")[1])
+            if isinstance(old, RealEntity):
+                return old
+            start = time.perf_counter()
+            e = self.__createAndAddNewEntity(data)
+            # the index changes only if an entity in it gets children, or the entity would be added to it; the children of a TabulationEntity were already known
+            # the ancestors looked up for the entities outside of the index are loaded from the bottom, so only the one that connects them to the index counts
+            index = self.__hierarchyIndex
+            if index is not None and not isinstance(old, TabulationEntity) \
+                    and (len(e.getChildren()) > 0 if index[1].contains(e.getId()) else self.__isReachable(e.getId(), index[1])):
+                self.__hierarchyVersion += 1
+            self.__metrics.recordLatency("explorer.parse", time.perf_counter() - start)
+            return e
 
     # Creates a new entity from its data and updates both dictionaries
     # If new proxy entities are created in the process, they too are added to __idMap
@@ -926,26 +2462,279 @@ class ICDExplorer:
             postcoordinationScale,
             browserUrl,
         )
+        old_e = self.__idMap.get(id)
         self.__idMap[id]=new_e
+        if classKind == "block" and codeRange != "":
+            self.__blockRanges[id] = (codeRange.split("-")[0], codeRange.split("-")[-1])
         if code != "":
             self.__codeToIdMap[code]=id
 
         for c in newChildren:
             c._setParent(new_e)
 
+        # the entities that contain the proxies used by the new entity are tracked, so that the proxies can be replaced when resolved
+        referenced = children + childrenElsewhere + exclusion + relatedEntitiesInMaternalChapter + relatedEntitiesInPerinatalChapter + [e for axis in postcoordinationScale for e in axis.getScaleEntity()]
+        if parent is not None:
+            referenced.append(parent)
+        for e in referenced:
+            if isinstance(e, ProxyEntity):
+                self.__proxyHolders.setdefault(e.getId(), []).append(new_e)
+
+        # the proxy for this entity, if any, is replaced with the new entity in all the other entities and in __idMap
+        # the proxy keeps working for the user that still has a reference to it
+        if isinstance(old_e, ProxyEntity):
+            self.__metrics.count("explorer.proxyResolutions")
+            old_e._setRealEntity(new_e)
+            for holder in self.__proxyHolders.pop(id, []):
+                holder._replaceProxy(old_e, new_e)
+
         return new_e
     
     def __str__(self) -> str:
-        return "ICDExplorer (#" + str(id(self)) + "):\n\t- release: " + self.__release + "\n\t- language: " + self.__language + "\n\t- useCodeRangesAsCodes: " + str(self.__useCodeRangesAsCodes)
+        release = self.__release if self.__release is not None else "(not found yet)"
+        return "ICDExplorer (#" + str(id(self)) + "):\n\t- release: " + release + "\n\t- language: " + self.__language + "\n\t- useCodeRangesAsCodes: " + str(self.__useCodeRangesAsCodes)
+
+
+# Asynchronous version of ICDExplorer, for use within asyncio event loops
+# Lookups, proxy resolutions and traversals can be awaited: the requests run on the thread pool of an AsyncICDAPIClient, so the event loop is never blocked
+# The entities are created and stored by an internal ICDExplorer, so their synchronous methods keep working (accessing an unresolved ProxyEntity still blocks)
+# Concurrent requests for the same id are merged into a single request
+class AsyncICDExplorer:
+    def __init__(
+        self,
+        language: str,
+        clientId: str,
+        clientSecret: str,
+        release: str | None = None,
+        customUrl: str | None = None,
+        useCodeRangesAsCodes: bool = False,
+        maxConcurrency: int = 10,
+        requestsPerSecond: float | None = None,
+        maxRetries: int = 3,
+        tokenFile: str | None = None,
+    ) -> None:
+        if customUrl is None: #creates correct API client
+            self.__clientAPI: AsyncICDAPIClient = AsyncICDOfficialAPIClient(clientId, clientSecret, maxConcurrency, requestsPerSecond, maxRetries, tokenFile)
+        else:
+            self.__clientAPI = AsyncICDOtherAPIClient(customUrl, maxConcurrency, requestsPerSecond, maxRetries)
+        self.__language = language
+        self.__clientId = clientId
+        self.__clientSecret = clientSecret
+        self.__requestedRelease = release
+        self.__customUrl = customUrl
+        self.__useCodeRangesAsCodes = useCodeRangesAsCodes
+        self.__explorer: ICDExplorer | None = None
+        self.__initialization: asyncio.Future | None = None
+        self.__pending: Dict[str, asyncio.Future] = {}
+
+    # Creates an explorer and waits for its initialization, so that errors in the parameters are raised immediately
+    @classmethod
+    async def create(
+        cls,
+        language: str,
+        clientId: str,
+        clientSecret: str,
+        release: str | None = None,
+        customUrl: str | None = None,
+        useCodeRangesAsCodes: bool = False,
+        maxConcurrency: int = 10,
+        requestsPerSecond: float | None = None,
+        maxRetries: int = 3,
+        tokenFile: str | None = None,
+    ) -> AsyncICDExplorer:
+        explorer = cls(language, clientId, clientSecret, release, customUrl, useCodeRangesAsCodes, maxConcurrency, requestsPerSecond, maxRetries, tokenFile)
+        await explorer.initialize()
+        return explorer
+
+    # Connects to the API and finds or checks the release, like the constructor of ICDExplorer does
+    # It's called automatically by the other async methods, calling it again has no effect
+    async def initialize(self) -> None:
+        if self.__explorer is not None:
+            return
+        if self.__initialization is None:
+            self.__initialization = asyncio.ensure_future(asyncio.get_running_loop().run_in_executor(None, self.__createExplorer))
+        try:
+            self.__explorer = await asyncio.shield(self.__initialization)
+        except Exception:
+            self.__initialization = None # allows trying again
+            raise
+
+    def __createExplorer(self) -> ICDExplorer:
+        self.__clientAPI._createClient() # type: ignore # the client singleton is created first, so that its connection pool is sized for maxConcurrency
+        return ICDExplorer(self.__language, self.__clientId, self.__clientSecret, release=self.__requestedRelease, customUrl=self.__customUrl, useCodeRangesAsCodes=self.__useCodeRangesAsCodes)
+
+    async def __getExplorer(self) -> ICDExplorer:
+        await self.initialize()
+        return self.__explorer # type: ignore
+
+    # Given a code, returns true if its a valid code for the parameters of this Explorer
+    async def isValidCode(self, code: str) -> bool:
+        try:
+            await self.getEntityFromCode(code)
+            return True
+        except LookupError:
+            return False
+
+    # Given an id, returns true if its a valid id for the parameters of this Explorer
+    async def isValidId(self, id: str) -> bool:
+        try:
+            await self.getEntityFromId(id)
+            return True
+        except LookupError:
+            return False
+
+    # Given a code, returns its corresponding entity
+    # Raises LookupError if code is not a valid code for the parameters of this Explorer
+    async def getEntityFromCode(self, code: str) -> Entity:
+        explorer = await self.__getExplorer()
+        e = explorer._getCachedEntityFromCode(code)
+        if e is not None:
+            return e
+        if self.__useCodeRangesAsCodes and "-" in code: #code ranges as codes
+            try:
+                e = (await self.getEntityFromCode(code.split("-")[0])).getParent()
+            except LookupError:
+                e = None
+            while e is not None: # controls the ancestors until it find the code or it reaches a chapter
+                e = await self.resolve(e)
+                if e.getCode() == code:
+                    return e
+                e = e.getParent()
+            raise LookupError("Code range \""+code+"\" was not found for release \""+explorer.getRelease()+"\" in language \""+self.__language+"\".")
+        error = explorer._getFromNegativeCache("code", code)
+        if error is not None:
+            raise error
+        try:
+            id = await self.__measure(explorer, "lookupCodeId", self.__clientAPI.lookupCodeId(code, explorer.getRelease(), self.__language))
+        except LookupError as e:
+            explorer._addToNegativeCache("code", code, e)
+            raise
+        return await self.__getRealEntity(id)
+
+    # Given an id, returns its corresponding entity
+    # Raises LookupError if id is not a valid id for the parameters of this Explorer
+    async def getEntityFromId(self, id: str) -> Entity:
+        explorer = await self.__getExplorer()
+        e = explorer._getCachedEntity(id)
+        if e is not None:
+            return e
+        error = explorer._getFromNegativeCache("id", id)
+        if error is not None:
+            raise error
+        try:
+            return await self.__getRealEntity(id)
+        except LookupError as e:
+            explorer._addToNegativeCache("id", id, e)
+            raise
+
+    # Returns the RealEntity for the given entity, looking it up in the API if it's an unresolved ProxyEntity
+    async def resolve(self, entity: Entity) -> Entity:
+        if isinstance(entity, RealEntity):
+            return entity
+        return await self.__getRealEntity(entity.getId())
+
+    # Returns the same list as entity.getDescendants(), but all the descendants are resolved level by level, with concurrent requests
+    async def getDescendants(self, entity: Entity, includeChildrenElsewhere: bool = False) -> list[Entity]:
+        root = await self.resolve(entity)
+        if not includeChildrenElsewhere and await self.__resolveRelated(root, "descendant"): # the whole subtree is looked up at once if the API can list its ids
+            return root.getDescendants()
+        frontier = [root]
+        visited = {root.getId()}
+        while len(frontier) > 0:
+            nextFrontier: list[Entity] = []
+            for e in await asyncio.gather(*[self.resolve(e) for e in frontier]):
+                for c in e.getChildren(includeChildrenElsewhere=includeChildrenElsewhere):
+                    if c.getId() not in visited:
+                        visited.add(c.getId())
+                        nextFrontier.append(c)
+            frontier = nextFrontier
+        return root.getDescendants(includeChildrenElsewhere=includeChildrenElsewhere)
+
+    # Returns the same list as entity.getAncestors(), resolving the ancestors without blocking the event loop
+    async def getAncestors(self, entity: Entity) -> list[Entity]:
+        root = await self.resolve(entity)
+        e = root.getParent()
+        while isinstance(e, RealEntity): # the ancestors that are already loaded need no request
+            e = e.getParent()
+        if e is not None: # the ancestors of the first one that is not loaded are listed while it's looked up
+            await asyncio.gather(self.resolve(e), self.__resolveRelated(e, "ancestor"))
+        e = root.getParent()
+        while e is not None:
+            e = (await self.resolve(e)).getParent()
+        return root.getAncestors()
+
+    def getLanguage(self) -> str:
+        return self.__language
+
+    # Returns the release used by this explorer; it's known only after the explorer has been initialized
+    def getRelease(self) -> str:
+        if self.__explorer is None:
+            raise RuntimeError("The release of an AsyncICDExplorer is only known after it has been initialized.")
+        return self.__explorer.getRelease()
+
+    # Looks up concurrently the ancestors or the descendants of entity, if the API can list their ids; returns false if it can't
+    async def __resolveRelated(self, entity: Entity, relation: str) -> bool:
+        explorer = await self.__getExplorer()
+        ids = await self.__measure(explorer, "lookupRelatedIds", self.__clientAPI.lookupRelatedIds(entity.getId(), explorer.getRelease(), self.__language, relation))
+        if ids is None:
+            return False
+        await asyncio.gather(*[self.__getRealEntity(id) for id in ids])
+        return True
+
+    async def __getRealEntity(self, id: str) -> Entity:
+        explorer = await self.__getExplorer()
+        e = explorer._getCachedEntity(id, countLookup=False)
+        if isinstance(e, RealEntity):
+            return e
+        if id not in self.__pending: # only the first request for an id reaches the API, the others wait for its result
+            self.__pending[id] = asyncio.ensure_future(self.__lookupId(explorer, id))
+        return await asyncio.shield(self.__pending[id])
+
+    async def __lookupId(self, explorer: ICDExplorer, id: str) -> Entity:
+        try:
+            return explorer._addEntity(await self.__measure(explorer, "lookupId", self.__clientAPI.lookupId(id, explorer.getRelease(), self.__language)))
+        finally:
+            del self.__pending[id]
+
+    # Awaits call, a call to the method name of the API client, and records it in the metrics of explorer like the requests of the explorer itself
+    async def __measure(self, explorer: ICDExplorer, name: str, call: Awaitable[Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return await call
+        finally:
+            explorer._getMetrics().count("api." + name)
+            explorer._getMetrics().recordLatency("api." + name, time.perf_counter() - start)
+
+    # Returns the metrics collected by the internal ICDExplorer, including the requests sent by this explorer, see ICDExplorer.getMetrics()
+    # The metrics, like the release, are only available after the explorer has been initialized
+    def getMetrics(self) -> dict[str, Any]:
+        return self.__getInitializedExplorer().getMetrics()
+
+    def resetMetrics(self) -> None:
+        self.__getInitializedExplorer().resetMetrics()
+
+    def addMetricsHook(self, hook: Callable[[str, str, float], None]) -> None:
+        self.__getInitializedExplorer().addMetricsHook(hook)
+
+    def __getInitializedExplorer(self) -> ICDExplorer:
+        if self.__explorer is None:
+            raise RuntimeError("The metrics of an AsyncICDExplorer are only available after it has been initialized.")
+        return self.__explorer
+
+    def __str__(self) -> str:
+        release = self.__explorer.getRelease() if self.__explorer is not None else "(not initialized)"
+        return "AsyncICDExplorer (#" + str(id(self)) + "):\n\t- release: " + release + "\n\t- language: " + self.__language + "\n\t- useCodeRangesAsCodes: " + str(self.__useCodeRangesAsCodes)
 
 
 # Class that represents a single postcoordination axis, with its name, its fields and its list of entities
 class PostcoordinationAxis:
+    __slots__ = ("__axisName", "__requiredPostCoordination", "__allowMultipleValues", "__scaleEntity")
+
     def __init__(self, axisName: str, requiredPostcoordination: bool, allowMultipleValues: str, scaleEntity: list[Entity]) -> None:
-        self.__axisName: str = axisName
+        self.__axisName: str = sys.intern(axisName)
         self.__requiredPostCoordination: bool = requiredPostcoordination
-        self.__allowMultipleValues: str = allowMultipleValues
-        self.__scaleEntity: list[Entity] = scaleEntity
+        self.__allowMultipleValues: str = sys.intern(allowMultipleValues)
+        self.__scaleEntity: tuple[Entity, ...] = tuple(scaleEntity)
     
     def getAxisName(self) -> str:
         return self.__axisName
@@ -957,7 +2746,11 @@ class PostcoordinationAxis:
         return self.__allowMultipleValues
     
     def getScaleEntity(self) -> list[Entity]:
-        return self.__scaleEntity.copy() # shallow copy
+        return list(self.__scaleEntity) # shallow copy
+
+    # Replaces the given proxy with its RealEntity in the list of entities of this axis
+    def _replaceProxy(self, proxy: ProxyEntity, real: Entity) -> None:
+        self.__scaleEntity = _replaceInTuple(self.__scaleEntity, proxy, real)
     
     def __str__(self) -> str:
         if self.__requiredPostCoordination:
@@ -965,4 +2758,110 @@ class PostcoordinationAxis:
         else:
             req_str = "Is NOT required"
         ent_str = "\n".join(["\t- " + e.getTitle() + " (" + e.getCode() + " - " + e.getId() + ")" for e in self.__scaleEntity])
-        return self.__axisName + "\n" + req_str + "\nAllow multiple values: " + self.__allowMultipleValues + "\n" + ent_str
\ No newline at end of file
+        return self.__axisName + "\n" + req_str + "\nAllow multiple values: " + self.__allowMultipleValues + "\n" + ent_str
+
+
+
+# Frozen copy of the hierarchy of the entities loaded by an ICDExplorer, stored in arrays of integers, see ICDExplorer.exportArrays()
+# Each entity is identified by its position in depth-first order, so each entity comes after its parent and its descendants are the entities that immediately follow it
+# The children of the entity i are childIndices[childOffsets[i]:childOffsets[i+1]] (compressed sparse rows), and the same holds for the children elsewhere
+# Codes and titles are positions in a table of strings, and class kinds positions in the list of class kind names
+# The arrays are returned as read-only memoryviews of 32-bit integers (8-bit for the class kinds), so that they can be used, for example, with numpy.asarray() without copying them
+class LinearizationArrays:
+    __slots__ = ("__ids", "__numbers", "__parents", "__childOffsets", "__childIndices", "__elsewhereOffsets", "__elsewhereIndices",
+                 "__classKindNames", "__classKinds", "__strings", "__codes", "__titles")
+
+    def __init__(self, ids: list[str], parents: array, childOffsets: array, childIndices: array, elsewhereOffsets: array, elsewhereIndices: array,
+                 classKindNames: list[str], classKinds: array, strings: list[str], codes: array, titles: array) -> None:
+        self.__ids: tuple[str, ...] = tuple(ids)
+        self.__numbers: Dict[str, int] = {id: i for i, id in enumerate(ids)}
+        self.__parents = memoryview(parents).toreadonly()
+        self.__childOffsets = memoryview(childOffsets).toreadonly()
+        self.__childIndices = memoryview(childIndices).toreadonly()
+        self.__elsewhereOffsets = memoryview(elsewhereOffsets).toreadonly()
+        self.__elsewhereIndices = memoryview(elsewhereIndices).toreadonly()
+        self.__classKindNames: tuple[str, ...] = tuple(classKindNames)
+        self.__classKinds = memoryview(classKinds).toreadonly()
+        self.__strings: tuple[str, ...] = tuple(strings)
+        self.__codes = memoryview(codes).toreadonly()
+        self.__titles = memoryview(titles).toreadonly()
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    # Returns the position of the entity with the given id, or -1 if it's not in the arrays
+    def getIndex(self, id: str) -> int:
+        return self.__numbers.get(id, -1)
+
+    def getId(self, index: int) -> str:
+        return self.__ids[index]
+
+    def getIds(self) -> list[str]:
+        return list(self.__ids)
+
+    def getCode(self, index: int) -> str:
+        return self.__strings[self.__codes[index]]
+
+    def getTitle(self, index: int) -> str:
+        return self.__strings[self.__titles[index]]
+
+    def getClassKind(self, index: int) -> str:
+        return self.__classKindNames[self.__classKinds[index]]
+
+    # The position of the parent of each entity, -1 for chapters
+    def getParents(self) -> memoryview:
+        return self.__parents
+
+    def getChildOffsets(self) -> memoryview:
+        return self.__childOffsets
+
+    def getChildIndices(self) -> memoryview:
+        return self.__childIndices
+
+    def getChildElsewhereOffsets(self) -> memoryview:
+        return self.__elsewhereOffsets
+
+    def getChildElsewhereIndices(self) -> memoryview:
+        return self.__elsewhereIndices
+
+    def getClassKindNames(self) -> list[str]:
+        return list(self.__classKindNames)
+
+    # The position of the class kind of each entity in getClassKindNames()
+    def getClassKinds(self) -> memoryview:
+        return self.__classKinds
+
+    def getStrings(self) -> list[str]:
+        return list(self.__strings)
+
+    # The position of the code of each entity in getStrings()
+    def getCodeIndices(self) -> memoryview:
+        return self.__codes
+
+    # The position of the title of each entity in getStrings()
+    def getTitleIndices(self) -> memoryview:
+        return self.__titles
+
+    # Returns the number of ancestors of each entity, computed in a single pass since parents come before their children
+    def getDepths(self) -> array:
+        depths = array("i", [0]) * len(self.__ids)
+        for i, parent in enumerate(self.__parents):
+            if parent >= 0:
+                depths[i] = depths[parent] + 1
+        return depths
+
+    # Returns the number of entities in the subtree of each entity, itself included, computed in a single pass from the last entity
+    def getSubtreeSizes(self) -> array:
+        sizes = array("i", [1]) * len(self.__ids)
+        for i in range(len(self.__ids) - 1, 0, -1):
+            if self.__parents[i] >= 0:
+                sizes[self.__parents[i]] += sizes[i]
+        return sizes
+
+    # Returns the positions of the entities without children, in order
+    def getLeaves(self) -> array:
+        offsets = self.__childOffsets
+        return array("i", (i for i in range(len(self.__ids)) if offsets[i] == offsets[i + 1]))
+
+    def __str__(self) -> str:
+        return "LinearizationArrays (#" + str(id(self)) + "):\n\t- entities: " + str(len(self.__ids)) + "\n\t- class kinds: " + ", ".join(self.__classKindNames)
@@ -22,6 +22,11 @@ class TestICDOtherAPIClient(unittest.TestCase):
         with self.assertRaises(LookupError):
             self.client.lookupCode("banana","2025-01","en")
     
+    def testLookupCodeId(self):
+        self.assertEqual(self.client.lookupCodeId("1F0Y","2025-01","en"),"1646490591/other")
+        with self.assertRaises(LookupError):
+            self.client.lookupCodeId("banana","2025-01","en")
+    
     def testLookupIdOk(self):
         json_dict = self.client.lookupId("218513628","2025-01","en")
         self.assertEqual(json_dict["code"],"9B71.1")
@@ -47,7 +52,36 @@ class TestICDOtherAPIClient(unittest.TestCase):
     def testNoDuplicateInstances(self):
         t = ICDOtherAPIClient(url)
         self.assertTrue(self.client is t)
+
+    def testPoolSettingsDoNotDuplicateInstances(self):
+        t = ICDOtherAPIClient(url, poolConnections=2, poolMaxSize=2, keepAlive=False)
+        self.assertTrue(self.client is t)
+        self.assertEqual(t.lookupId("218513628","2025-01","en")["code"],"9B71.1")
     
+    def testRequestsPerSecond(self):
+        t = ICDOtherAPIClient("http://127.0.0.1/", requestsPerSecond=5)
+        start = time.time()
+        for _ in range(10):
+            t.checkRelease("2025-01","en")
+        self.assertGreaterEqual(time.time()-start,0.9)
+    
+    def testLazyExplorer(self):
+        explorer = ICDExplorer("en","","",customUrl="http://127.0.0.1:1/",lazy=True) #unreachable, but not contacted yet
+        self.assertRaises(ConnectionError,explorer.getRelease)
+        explorer = ICDExplorer("en","","",release="2025-01",customUrl=url,lazy=True)
+        self.assertEqual(explorer.getMetrics()["counters"],{})
+        self.assertEqual(explorer.getEntityFromCode("V").getId(),"231358748")
+        self.assertEqual(explorer.getRelease(),"2025-01")
+
+    def testLatestReleaseReused(self): #needs to be updated when new release comes out
+        self.assertEqual(ICDExplorer("en","","",customUrl=url).getRelease(),"2025-01")
+        explorer = ICDExplorer("en","","",customUrl=url)
+        self.assertEqual(explorer.getRelease(),"2025-01")
+        self.assertNotIn("api.getLatestRelease",explorer.getMetrics()["counters"])
+        explorer = ICDExplorer("en","","",customUrl=url,latestReleaseTtl=0)
+        self.assertEqual(explorer.getRelease(),"2025-01")
+        self.assertEqual(explorer.getMetrics()["counters"]["api.getLatestRelease"],1)
+
     def testGetBrowserUrl(self):
         explorer = ICDExplorer("en","","",release="2025-01",customUrl=url)
         e = explorer.getEntityFromCode("V")
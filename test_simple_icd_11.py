@@ -1,5 +1,7 @@
-import unittest
-from simple_icd_11 import ICDOfficialAPIClient, ICDExplorer, ProxyEntity, RealEntity
+import unittest, asyncio, tempfile, os, sqlite3, requests
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from simple_icd_11 import ICDOfficialAPIClient, ICDExplorer, AsyncICDExplorer, ProxyEntity, RealEntity, _ScheduledSession
 
 class TestICDOfficialAPIClient(unittest.TestCase):
     @classmethod
@@ -29,12 +31,46 @@ class TestICDOfficialAPIClient(unittest.TestCase):
         with self.assertRaises(LookupError):
             self.client.lookupCode("banana","2024-01","en")
 
+    def testLookupCodeId(self):
+        self.assertEqual(self.client.lookupCodeId("1F0Y","2024-01","en"),"1646490591/other")
+        with self.assertRaises(LookupError):
+            self.client.lookupCodeId("banana","2024-01","en")
+
     def testLookupCodeOkOldToken(self):
         self.compromiseToken()
         json_dict = self.client.lookupCode("1F0Y","2024-01","en")
         self.assertEqual(json_dict["code"],"1F0Y")
         self.assertEqual(json_dict["@id"],"http://id.who.int/icd/release/11/2024-01/mms/1646490591/other")
 
+    def testLookupCodeOkExpiringToken(self):
+        self.client._ICDOfficialAPIClient__tokenExpiration = 0 # type: ignore
+        json_dict = self.client.lookupCode("1F0Y","2024-01","en")
+        self.assertEqual(json_dict["code"],"1F0Y")
+        self.assertGreater(self.client._ICDOfficialAPIClient__tokenExpiration,0) # type: ignore
+
+    def testTokenFile(self):
+        path = os.path.join(tempfile.mkdtemp(),"tokens.db")
+        instances = ICDOfficialAPIClient._instances
+        try:
+            ICDOfficialAPIClient._instances = {}
+            first = ICDOfficialAPIClient(self.clientId,self.clientSecret,tokenFile=path)
+            ICDOfficialAPIClient._instances = {} # as if the second client was created by another process
+            second = ICDOfficialAPIClient(self.clientId,self.clientSecret,tokenFile=path)
+            self.assertIsNot(first,second)
+            self.assertEqual(first._ICDOfficialAPIClient__token,second._ICDOfficialAPIClient__token) # type: ignore
+            self.assertEqual(second.lookupCode("1F0Y","2024-01","en")["code"],"1F0Y")
+        finally:
+            ICDOfficialAPIClient._instances = instances
+
+    def testLookupRelatedIds(self):
+        ancestors = self.client.lookupRelatedIds("1646490591/other","2024-01","en","ancestor")
+        self.assertIn("1646490591",ancestors) # type: ignore
+        descendants = self.client.lookupRelatedIds("1646490591","2024-01","en","descendant")
+        self.assertIn("1646490591/other",descendants) # type: ignore
+        self.assertNotIn("1646490591",descendants) # type: ignore
+        with self.assertRaises(LookupError):
+            self.client.lookupRelatedIds("5","2024-01","en","ancestor")
+
     def testLookupIdOk(self):
         json_dict = self.client.lookupId("218513628","2024-01","en")
         self.assertEqual(json_dict["code"],"9B71.1")
@@ -95,6 +131,64 @@ class TestICDOfficialAPIClient(unittest.TestCase):
 
 
 
+# Tests the retries of the requests without connecting to the API, with a session that returns prepared answers
+class TestScheduledSession(unittest.TestCase):
+    class FakeSession:
+        def __init__(self, answers):
+            self.answers = answers
+            self.calls = 0
+
+        def request(self, method, uri, **kwargs):
+            answer = self.answers[min(self.calls,len(self.answers)-1)]
+            self.calls += 1
+            if isinstance(answer,Exception):
+                raise answer
+            r = requests.Response()
+            r.status_code = answer[0]
+            r.headers.update(answer[1])
+            return r
+
+    def send(self, answers, maxRetries=3):
+        session = self.FakeSession(answers)
+        with mock.patch("time.sleep") as sleep:
+            try:
+                r = _ScheduledSession(session,None,maxRetries).get("http://localhost/")
+            except requests.ConnectionError:
+                r = None
+        return r, session.calls, [c.args[0] for c in sleep.call_args_list]
+
+    def testRetryAfterError(self):
+        r, calls, delays = self.send([(503,{}),(429,{"Retry-After":"2"}),(200,{})])
+        self.assertEqual(r.status_code,200) # type: ignore
+        self.assertEqual(calls,3)
+        self.assertTrue(0 <= delays[0] <= _ScheduledSession.BACKOFF_BASE)
+        self.assertEqual(delays[1],2.0)
+
+    def testRetryAfterIsCapped(self):
+        _, _, delays = self.send([(429,{"Retry-After":"86400"}),(200,{})])
+        self.assertEqual(delays,[_ScheduledSession.RETRY_AFTER_MAX])
+        _, _, delays = self.send([(503,{"Retry-After":"Wed, 21 Oct 2099 07:28:00 GMT"}),(200,{})])
+        self.assertEqual(delays,[_ScheduledSession.RETRY_AFTER_MAX])
+
+    def testBackoff(self):
+        r, calls, delays = self.send([(502,{})],maxRetries=10)
+        self.assertEqual(r.status_code,502) # type: ignore
+        self.assertEqual(calls,11)
+        for attempt, delay in enumerate(delays):
+            self.assertTrue(0 <= delay <= min(_ScheduledSession.BACKOFF_MAX,_ScheduledSession.BACKOFF_BASE*2**attempt))
+
+    def testNoRetry(self):
+        r, calls, delays = self.send([(404,{}),(200,{})])
+        self.assertEqual((r.status_code,calls,delays),(404,1,[])) # type: ignore
+        r, calls, _ = self.send([(503,{})],maxRetries=0)
+        self.assertEqual((r.status_code,calls),(503,1)) # type: ignore
+
+    def testNetworkErrors(self):
+        r, calls, _ = self.send([requests.ConnectionError(),requests.Timeout(),(200,{})])
+        self.assertEqual((r.status_code,calls),(200,3)) # type: ignore
+        r, calls, _ = self.send([requests.ConnectionError()],maxRetries=2)
+        self.assertEqual((r,calls),(None,3))
+
 class TestProxyEntity(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -140,6 +234,45 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
         self.assertTrue(self.explorer.isValidId("1042184245/unspecified"))
         self.assertFalse(self.explorer.isValidId("cipolla"))
 
+    def testNegativeCache(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",negativeCacheMaxEntries=2)
+        self.assertFalse(explorer.isValidCode("banana"))
+        self.assertFalse(explorer.isValidCode("banana"))
+        with self.assertRaises(LookupError):
+            explorer.getEntityFromCode("banana")
+        self.assertFalse(explorer.isValidId("cipolla"))
+        self.assertIsInstance(explorer.getEntitiesFromIds(["cipolla"])[0],LookupError)
+        self.assertEqual(explorer.getNegativeCacheInfo(),{"hits":3,"misses":2,"entries":2,"maxEntries":2})
+        self.assertFalse(explorer.isValidCode("pomodoro"))
+        self.assertEqual(explorer.getNegativeCacheInfo()["entries"],2)
+        self.assertTrue(explorer.isValidCode("5C90.2"))
+
+    def testMetrics(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        events = []
+        explorer.addMetricsHook(lambda kind, name, value: events.append((kind,name)))
+        explorer.getEntityFromCode("8B25.4")
+        explorer.getEntityFromCode("8B25.4")
+        metrics = explorer.getMetrics()
+        self.assertEqual(metrics["counters"]["api.lookupCodeId"],1)
+        self.assertEqual(metrics["counters"]["api.lookupId"],1)
+        self.assertEqual(metrics["counters"]["explorer.codeMap.hits"],1)
+        self.assertEqual(metrics["counters"]["explorer.codeMap.misses"],1)
+        self.assertEqual(metrics["latencies"]["api.lookupId"]["count"],1)
+        self.assertEqual(metrics["latencies"]["explorer.parse"]["buckets"][float("inf")],1)
+        self.assertIn(("latency","explorer.parse"),events)
+        explorer.getEntityFromCode("8B25.4").getParent().getTitle()
+        self.assertEqual(explorer.getMetrics()["counters"]["explorer.proxyResolutions"],1)
+        explorer.resetMetrics()
+        self.assertEqual(explorer.getMetrics(),{"counters":{},"latencies":{}})
+        def brokenHook(kind, name, value):
+            raise RuntimeError()
+        explorer.addMetricsHook(brokenHook)
+        self.assertEqual(explorer.getEntityFromCode("5C90.0").getId(),"831518052") # the error of the hook doesn't stop the lookup
+        with self.assertRaises(LookupError):
+            explorer.getEntityFromCode("XX99")
+        self.assertEqual(explorer.getMetrics()["counters"]["api.lookupCodeId"],2)
+
     def testGetEntityFromCode(self):
         e = self.explorer.getEntityFromCode("5C90.0")
         self.assertEqual(e.getId(),"831518052")
@@ -148,12 +281,183 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
         with self.assertRaises(LookupError):
             self.explorer.getEntityFromCode("5A00-5B3Z")
 
+    def testBlocksContainingCode(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",useCodeRangesAsCodes=True)
+        blocks = explorer.getBlocksContainingCode("2A30.0")
+        self.assertIn("1147802348",[b.getId() for b in blocks])
+        for b in blocks:
+            self.assertEqual(b.getClassKind(),"block")
+        self.assertEqual(blocks,sorted(blocks,key=lambda b: len(b.getAncestors()),reverse=True))
+        self.assertEqual(explorer.getBlocksContainingCode("01"),[])
+        self.assertTrue(explorer.isValidCode("8B10-8B1Z"))
+        self.assertFalse(explorer.isValidCode("8B10-8B1Y"))
+        self.assertEqual(explorer.getEntityFromCode("5A00-5B3Z").getId(),"461716838")
+
     def testGetEntityFromId(self):
         e = self.explorer.getEntityFromId("831518052")
         self.assertEqual(e.getCode(),"5C90.0")
         with self.assertRaises(LookupError):
             self.explorer.getEntityFromId("5A00-5B3Z")
 
+    def testGetEntitiesFromCodes(self):
+        entities = self.explorer.getEntitiesFromCodes(["5C90.0","banana","2B30","5C90.0"])
+        self.assertEqual(entities[0].getId(),"831518052") # type: ignore
+        self.assertIsInstance(entities[1],LookupError)
+        self.assertEqual(entities[2].getId(),"1528863768") # type: ignore
+        self.assertIs(entities[0],entities[3])
+        entities = self.explorerCodeRanges.getEntitiesFromCodes(["5A00-5B3Z","5A00-5B3Y"],maxWorkers=2)
+        self.assertEqual(entities[0].getId(),"461716838") # type: ignore
+        self.assertIsInstance(entities[1],LookupError)
+
+    def testGetEntitiesFromIds(self):
+        entities = self.explorer.getEntitiesFromIds(iter(["831518052","5A00-5B3Z","1042184245/unspecified"]))
+        self.assertEqual(entities[0].getCode(),"5C90.0") # type: ignore
+        self.assertIsInstance(entities[1],LookupError)
+        self.assertEqual(entities[2].getId(),"1042184245/unspecified") # type: ignore
+        self.assertEqual(self.explorer.getEntitiesFromIds([]),[])
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        children = [c.getId() for c in explorer.getEntityFromCode("5C90").getChildren()] # known only as proxies
+        for e in explorer.getEntitiesFromIds(children):
+            self.assertIsInstance(e,RealEntity)
+
+    def testCacheFile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"cache.sqlite")
+            explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",cacheFile=path)
+            self.assertEqual(explorer.getEntityFromCode("5C90.0").getId(),"831518052")
+            self.assertFalse(explorer.isValidCode("banana"))
+            explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",cacheFile=path,cacheMaxEntries=1)
+            e = explorer.getEntityFromCode("5C90.0")
+            self.assertEqual(e.getId(),"831518052")
+            self.assertEqual(e.getParent().getCode(),"5C90") # type: ignore
+            explorer.getEntityFromCode("5C90.1")
+            connection = sqlite3.connect(path)
+            for table in ["entities","codes"]:
+                self.assertLessEqual(connection.execute("SELECT COUNT(*) FROM "+table).fetchone()[0],1)
+            connection.close()
+
+    def testSnapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"snapshot.sqlite")
+            self.explorer.createSnapshot(path)
+            ICDExplorer("en",self.clientId,self.clientSecret) # finds the latest release of the API, which must not be used by the snapshot
+            explorer = ICDExplorer("en","","",snapshotFile=path,useCodeRangesAsCodes=True)
+            self.assertEqual(explorer.getRelease(),"2024-01")
+            self.assertEqual(explorer.getEntityFromCode("5C90.0").getId(),"831518052")
+            self.assertEqual(explorer.getEntityFromCode("5A00-5B3Z").getId(),"461716838")
+            self.assertEqual(explorer.getEntityFromCode("5C90.0&XN8ZG").getId(),"831518052") # mapped to the stem code, like the API does
+            self.assertFalse(explorer.isValidCode("5C90.0&XX99"))
+            self.assertFalse(explorer.isValidCode("banana"))
+            self.assertEqual(len(explorer.getEntityFromId("1189893025").getDescendants(includeChildrenElsewhere=True)),7)
+            with self.assertRaises(LookupError):
+                ICDExplorer("en","","",release="2023-01",snapshotFile=path)
+            with self.assertRaises(LookupError):
+                ICDExplorer("it","","",snapshotFile=path)
+
+    def testPrefetch(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        e = explorer.getEntityFromId("1189893025")
+        explorer.prefetch(e,depth=1)
+        for c in e.getChildren():
+            self.assertIsInstance(explorer._getCachedEntity(c.getId()),RealEntity)
+        explorer.prefetch(e,includeChildrenElsewhere=True,maxWorkers=4)
+        descendants = e.getDescendants(includeChildrenElsewhere=True)
+        self.assertEqual(len(descendants),7)
+        for d in descendants:
+            self.assertIsInstance(explorer._getCachedEntity(d.getId()),RealEntity)
+
+    def testPrefetchWholeSubtree(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        e = explorer.getEntityFromId("1189893025")
+        explorer.prefetch(e)
+        lookups = explorer.getMetrics()["counters"]["api.lookupId"]
+        descendants = e.getDescendants()
+        self.assertEqual(explorer.getMetrics()["counters"]["api.lookupId"],lookups)
+        for d in descendants:
+            self.assertIsInstance(explorer._getCachedEntity(d.getId()),RealEntity)
+
+    def testPrefetchAncestors(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        e = explorer.getEntityFromCode("1F0Y")
+        explorer.prefetchAncestors(e)
+        for a in e.getAncestors():
+            self.assertIsInstance(explorer._getCachedEntity(a.getId()),RealEntity)
+        self.assertEqual(e.getAncestors()[-1].getClassKind(),"chapter")
+
+    def testLoadSimpleTabulation(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        path = os.path.join(tempfile.mkdtemp(),"SimpleTabulation.txt")
+        with open(path,"w",encoding="utf-8") as f:
+            f.write("Foundation URI\tLinearization (release) URI\tCode\tBlockId\tTitle\tClassKind\n")
+            f.write("\thttp://id.who.int/icd/release/11/mms/1435254666\t01\t\tCertain infectious or parasitic diseases\tchapter\n")
+            f.write("\thttp://id.who.int/icd/release/11/mms/588616678\t\tBlockL1-1A0\t- Gastroenteritis or colitis of infectious origin\tblock\n")
+            f.write("\thttp://id.who.int/icd/release/11/mms/135352227\t\tBlockL2-1A0\t- - Bacterial intestinal infections\tblock\n")
+            f.write("\thttp://id.who.int/icd/release/11/mms/257068234\t1A00\t\t- - - Cholera\tcategory\n")
+        self.assertEqual(explorer.loadSimpleTabulation(path),4)
+        e = explorer.getEntityFromCode("1A00")
+        self.assertEqual(e.getTitle(),"Cholera")
+        self.assertEqual([a.getId() for a in e.getAncestors()],["135352227","588616678","1435254666"])
+        self.assertEqual(explorer.getEntityFromId("588616678").getBlockId(),"BlockL1-1A0")
+        self.assertFalse(explorer.isValidCode("1A0A"))
+        self.assertNotIn("api.lookupId",explorer.getMetrics()["counters"])
+        self.assertNotIn("api.lookupCodeId",explorer.getMetrics()["counters"])
+        self.assertNotEqual(e.getDefinition(),"") # looked up in the API
+        block = explorer.getEntityFromId("135352227")
+        self.assertTrue(explorer.isDescendantOf(e,block))
+        self.assertFalse(explorer.isDescendantOf(block,e))
+        self.assertEqual(explorer.getDepth(e),3)
+        self.assertEqual(explorer.getLowestCommonAncestor(e,explorer.getEntityFromId("588616678")).getId(),"588616678") # type: ignore
+        index = explorer._ICDExplorer__hierarchyIndex # type: ignore
+        self.assertNotEqual(block.getDefinition(),"") # looked up in the API, without changing the hierarchy
+        self.assertEqual(explorer.getDepth(block),2)
+        self.assertIs(explorer._ICDExplorer__hierarchyIndex,index) # type: ignore
+        self.assertEqual(explorer.rollUpCodes(["1A00","01","XX99","1A00&XN8ZG"]),(["01","01","","01"],[True,True,False,True]))
+        self.assertEqual(explorer.rollUpCodes(["1A00","01"],depth=2,result="id"),(["135352227","1435254666"],[True,True]))
+        self.assertEqual(explorer.rollUpCodes(["1A00","XX99"],result="depth"),([3,-1],[True,False]))
+        with self.assertRaises(ValueError):
+            explorer.rollUpCodes(["1A00"],result="title")
+        rangesExplorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",useCodeRangesAsCodes=True)
+        rangesExplorer.loadSimpleTabulation(path)
+        self.assertEqual(rangesExplorer.rollUpCodes(["1A00"],depth=1),([""],[True])) # the code range of the block is not in the file
+        self.assertNotIn("api.lookupId",rangesExplorer.getMetrics()["counters"])
+        arrays = explorer.exportArrays()
+        self.assertEqual(arrays.getIds(),["1435254666","588616678","135352227","257068234"])
+        self.assertEqual(list(arrays.getParents()),[-1,0,1,2])
+        self.assertEqual(list(arrays.getChildOffsets()),[0,1,2,3,3])
+        self.assertEqual(list(arrays.getChildIndices()),[1,2,3])
+        self.assertEqual(arrays.getCode(3),"1A00")
+        self.assertEqual(arrays.getClassKind(1),"block")
+        self.assertEqual(list(arrays.getDepths()),[0,1,2,3])
+        self.assertEqual(list(arrays.getSubtreeSizes()),[4,3,2,1])
+        self.assertEqual(list(arrays.getLeaves()),[3])
+        self.assertEqual(rangesExplorer.exportArrays().getCode(2),"") # without looking up the block
+        self.assertNotIn("api.lookupId",rangesExplorer.getMetrics()["counters"])
+        chapterExplorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        chapter = chapterExplorer.getEntityFromId("1435254666") # its children are created as proxies before the file is read
+        chapterExplorer.loadSimpleTabulation(path)
+        self.assertIn("588616678",[c.getId() for c in chapter.getChildren()])
+        self.assertEqual(chapterExplorer.exportArrays().getIds(),["1435254666","588616678","135352227","257068234"])
+        self.assertEqual(chapterExplorer.rollUpCodes(["1A00"],depth=1,result="id"),(["588616678"],[True]))
+        with self.assertRaises(ValueError):
+            explorer.loadSimpleTabulation(os.path.abspath(__file__))
+
+    def testHierarchyQueries(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        a = explorer.getEntityFromCode("1A00")
+        b = explorer.getEntityFromCode("1A07.1")
+        self.assertEqual(explorer.getLowestCommonAncestor(a,b).getCodeRange(),"1A00-1A0Z") # type: ignore
+        self.assertIsNone(explorer.getLowestCommonAncestor(a,explorer.getEntityFromCode("2A00")))
+        chapter = explorer.getEntityFromCode("01")
+        explorer.prefetch(chapter)
+        self.assertTrue(explorer.isDescendantOf(b,chapter))
+        self.assertFalse(explorer.isDescendantOf(chapter,b))
+        self.assertEqual(explorer.getDepth(b),len(b.getAncestors()))
+        self.assertEqual(explorer.getLowestCommonAncestor(b,b.getParent()),b.getParent()) # type: ignore
+        index = explorer._ICDExplorer__hierarchyIndex # type: ignore
+        c = explorer.getEntityFromCode("2A00")
+        self.assertEqual(explorer.getDepth(c),len(c.getAncestors())) # its ancestors are looked up, but they are too few to rebuild the index
+        self.assertIs(explorer._ICDExplorer__hierarchyIndex,index) # type: ignore
+
     def testGetLanguage(self):
         self.assertEqual(self.explorer.getLanguage(),"en")
 
@@ -303,6 +607,34 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
             self.assertIn(a.getId(),correct_ancestors)
             correct_ancestors.remove(a.getId())
 
+    def testInheritedValuesAreStable(self):
+        e = self.explorer.getEntityFromId("1793762788")
+        self.assertEqual([a.getId() for a in e.getAncestors()],[a.getId() for a in e.getAncestors()])
+        self.assertEqual([ex.getCode() for ex in e.getExclusion()],[ex.getCode() for ex in e.getExclusion()])
+        for ex in e.getExclusion(): # the proxies resolved above are replaced, including those inherited from the ancestors
+            self.assertIsInstance(ex,RealEntity)
+        self.assertEqual(e.getCodingNote(includeFromUpperLevels=True),e.getCodingNote(includeFromUpperLevels=True))
+        ancestors = e.getAncestors()
+        ancestors.append(e)
+        self.assertNotIn(e,e.getAncestors())
+
+    def testIterDescendants(self):
+        e = self.explorer.getEntityFromId("1189893025")
+        self.assertEqual([d.getId() for d in e.iterDescendants(includeChildrenElsewhere=True)],[d.getId() for d in e.getDescendants(includeChildrenElsewhere=True)])
+        self.assertEqual([d.getId() for d in e.iterDescendants(includeChildrenElsewhere=True,maxDepth=1)],[c.getId() for c in e.getChildren(includeChildrenElsewhere=True)])
+        descendants = [d.getId() for d in e.iterDescendants(includeChildrenElsewhere=True,breadthFirst=True)]
+        self.assertEqual(sorted(descendants),sorted(["566170052","1529247463","605819742","765928537","1822281676","1529247463/other","1529247463/unspecified"]))
+        self.assertEqual(descendants[:2],[c.getId() for c in e.getChildren(includeChildrenElsewhere=True)])
+        descendants = [d.getId() for d in e.iterDescendants(includeChildrenElsewhere=True,prune=lambda d: d.getId()=="1529247463")]
+        self.assertEqual(descendants,["566170052"])
+        self.assertEqual(list(e.iterDescendants(maxDepth=0)),[])
+
+    def testIterAncestors(self):
+        e = self.explorer.getEntityFromId("120848300")
+        self.assertEqual([a.getId() for a in e.iterAncestors()],[a.getId() for a in e.getAncestors()])
+        self.assertEqual([a.getId() for a in e.iterAncestors(maxDepth=1)],[e.getParent().getId()]) # type: ignore
+        self.assertEqual(list(self.explorer.getEntityFromCode("X").iterAncestors()),[])
+
     def testGetIndexTerm(self):
         e = self.explorer.getEntityFromId("2003830496")
         correct_terms = ["Follicular lymphoma grade 2", "mixed nodular lymphoma", "follicular reticulolymphosarcoma", "nodular reticulolymphosarcoma", "small and large cleaved cell follicular lymphoma", "mixed lymphocytic histiocytic nodular lymphoma", "follicular malignant lymphoma of mixed cell type", "mixed small cleaved and large cell follicular malignant lymphoma", "malignant nodular lymphoma of mixed lymphocytic-histiocytic", "malignant nodular lymphoma of mixed cell type", "follicular non Hodgkin lymphoma of mixed small cleaved cell and large cell", "cleaved large cell follicular lymphoma", "follicular germinoblastoma", "follicular lymphosarcoma of mixed cell type", "nodular lymphoma of mixed cell type of lymphocytic-histiocytic"]
@@ -391,6 +723,14 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
         e = self.explorer.getEntityFromId("2091156678")
         self.assertEqual(e.getBrowserUrl(),"https://icd.who.int/browse/2024-01/mms/en#2091156678")
 
+    def testCompactEntities(self):
+        e = self.explorer.getEntityFromCode("DA24.00")
+        self.assertFalse(hasattr(e,"__dict__"))
+        children = e.getChildren()
+        children.append(e)
+        self.assertEqual(len(e.getChildren()),0)
+        self.assertFalse(hasattr(e.getParent(),"__dict__"))
+
     def testGetRealEntityNoDuplicateRequests(self):
         explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
         explorer.getEntityFromId("1345814274")
@@ -402,6 +742,30 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
         self.assertIsInstance(entity2,RealEntity)
         self.assertEqual(id(entity1),id(entity2))
 
+    def testSharedBetweenThreads(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            entities = list(executor.map(explorer.getEntityFromCode,["8B25.4"]*16))
+            proxies = explorer.getEntityFromId("1345814274").getChildren()
+            titles = list(executor.map(lambda e: e.getTitle(),proxies*8))
+        for e in entities:
+            self.assertIs(e,entities[0])
+        self.assertEqual(titles,[p.getTitle() for p in proxies]*8)
+        for p in proxies:
+            self.assertIsInstance(explorer.getEntityFromId(p.getId()),RealEntity)
+
+    def testResolvedProxiesAreReplaced(self):
+        explorer = ICDExplorer("en",self.clientId,self.clientSecret,release="2024-01")
+        parent = explorer.getEntityFromId("1345814274")
+        proxy_entity = explorer.getEntityFromId("377572273")
+        self.assertIsInstance(proxy_entity,ProxyEntity)
+        self.assertIn(proxy_entity,parent.getChildren())
+        real_entity = explorer._getRealEntity("377572273")
+        self.assertIs(explorer.getEntityFromId("377572273"),real_entity)
+        self.assertIn(real_entity,parent.getChildren())
+        self.assertNotIn(proxy_entity,parent.getChildren())
+        self.assertEqual(proxy_entity.getCode(),real_entity.getCode())
+
     def testEntityStr(self):
         e = self.explorer.getEntityFromId("447363203")
         self.assertEqual(str(e),"Assault by causing a fall or jump ( - 447363203)\n")
@@ -415,4 +779,62 @@ class TestPackageCore(unittest.TestCase): #tests ICDExplorer, RealEntity and Pos
         self.assertEqual(str(self.explorer).split(")")[1], ":\n\t- release: 2024-01\n\t- language: en\n\t- useCodeRangesAsCodes: False")
     
     def testPostcoordinationAxisStr(self):
-        self.assertEqual(str(self.explorer.getEntityFromId("1611724421").getPostcoordinationScale()[0]), "hasManifestation\nIs NOT required\nAllow multiple values: AllowAlways\n\t- Dementia due to Alzheimer disease (6D80 - 795022044)")
\ No newline at end of file
+        self.assertEqual(str(self.explorer.getEntityFromId("1611724421").getPostcoordinationScale()[0]), "hasManifestation\nIs NOT required\nAllow multiple values: AllowAlways\n\t- Dementia due to Alzheimer disease (6D80 - 795022044)")
+
+
+
+class TestAsyncICDExplorer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        f = open("api_credentials.txt", "r")
+        cls.clientId = f.readline().strip()
+        cls.clientSecret = f.readline().strip()
+        f.close()
+
+    def testLookups(self):
+        async def run():
+            explorer = await AsyncICDExplorer.create("en",self.clientId,self.clientSecret,release="2024-01")
+            self.assertEqual(explorer.getRelease(),"2024-01")
+            e = await explorer.getEntityFromCode("5C90.0")
+            self.assertEqual(e.getId(),"831518052")
+            e = await explorer.getEntityFromId("831518052")
+            self.assertEqual(e.getCode(),"5C90.0")
+            self.assertTrue(await explorer.isValidCode("02"))
+            self.assertFalse(await explorer.isValidCode("banana"))
+            self.assertTrue(await explorer.isValidId("1042184245/unspecified"))
+            self.assertFalse(await explorer.isValidId("cipolla"))
+            with self.assertRaises(LookupError):
+                await explorer.getEntityFromId("5A00-5B3Z")
+        asyncio.run(run())
+
+    def testCodeRanges(self):
+        async def run():
+            explorer = await AsyncICDExplorer.create("en",self.clientId,self.clientSecret,release="2024-01",useCodeRangesAsCodes=True)
+            e = await explorer.getEntityFromCode("5A00-5B3Z")
+            self.assertEqual(e.getId(),"461716838")
+            self.assertTrue(await explorer.isValidCode("8B10-8B1Z"))
+        asyncio.run(run())
+
+    def testWrongRelease(self):
+        with self.assertRaises(LookupError):
+            asyncio.run(AsyncICDExplorer.create("en",self.clientId,self.clientSecret,release="3034-01"))
+
+    def testTraversals(self):
+        async def run():
+            explorer = AsyncICDExplorer("en",self.clientId,self.clientSecret,release="2024-01",maxConcurrency=4)
+            e = await explorer.getEntityFromId("1189893025")
+            descendants = await explorer.getDescendants(e, includeChildrenElsewhere=True)
+            self.assertEqual(sorted([d.getId() for d in descendants]),sorted(["566170052","1529247463","605819742","765928537","1822281676","1529247463/other","1529247463/unspecified"]))
+            e = await explorer.getEntityFromId("120848300")
+            ancestors = await explorer.getAncestors(e)
+            self.assertEqual(sorted([a.getId() for a in ancestors]),sorted(["1979741228","1060046426","868865918"]))
+        asyncio.run(run())
+
+    def testConcurrentRequestsReturnSameEntity(self):
+        async def run():
+            explorer = await AsyncICDExplorer.create("en",self.clientId,self.clientSecret,release="2024-01")
+            entities = await asyncio.gather(*[explorer.getEntityFromId("1709907983") for _ in range(10)])
+            for e in entities:
+                self.assertIs(e,entities[0])
+                self.assertIsInstance(e,RealEntity)
+        asyncio.run(run())